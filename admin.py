@@ -3,7 +3,8 @@ import logging
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import selectinload
 from models import db, User, GeneratedContent, ChatSession
 
 # Configure logging
@@ -30,45 +31,50 @@ def superadmin_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def get_platform_totals(since):
+    """Platform-wide user and content totals, plus how many of each were created since `since`.
+
+    One aggregate query per table instead of a round-trip per number.
+    """
+    total_users, active_users, new_users = db.session.query(
+        func.count(User.id),
+        func.count(case((User.is_active.is_(True), 1))),
+        func.count(case((User.created_at >= since, 1)))
+    ).one()
+    total_content_items, total_words, total_downloads, new_content = db.session.query(
+        func.count(GeneratedContent.id),
+        func.coalesce(func.sum(GeneratedContent.word_count), 0),
+        func.coalesce(func.sum(GeneratedContent.download_count), 0),
+        func.count(case((GeneratedContent.created_at >= since, 1)))
+    ).one()
+    total_chat_sessions = db.session.query(func.count(ChatSession.id)).scalar()
+
+    return {
+        'total_users': total_users,
+        'active_users': active_users,
+        'total_content_items': total_content_items,
+        'published_content': 0,  # Content no longer has public/view tracking
+        'total_chat_sessions': total_chat_sessions,
+        'total_words': total_words,
+        'total_downloads': total_downloads,
+        'total_views': 0,
+        'monthly_users': new_users,
+        'monthly_content': new_content
+    }
+
 @admin_bp.route('/')
 @login_required
 @superadmin_required
 def dashboard():
     """Admin dashboard with platform statistics"""
     try:
-        # Get platform statistics
-        total_users = User.query.count()
-        active_users = User.query.filter_by(is_active=True).count()
-        total_content_items = GeneratedContent.query.count()
-        published_content = GeneratedContent.query.filter_by(is_public=True).count()
-        total_chat_sessions = ChatSession.query.count()
+        current_month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        stats = get_platform_totals(current_month_start)
         
         # Get recent activity
         recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
-        recent_content = GeneratedContent.query.order_by(GeneratedContent.created_at.desc()).limit(10).all()
-        
-        # Get usage statistics
-        total_words = db.session.query(func.sum(GeneratedContent.word_count)).scalar() or 0
-        total_downloads = db.session.query(func.sum(GeneratedContent.download_count)).scalar() or 0
-        total_views = db.session.query(func.sum(GeneratedContent.view_count)).scalar() or 0
-        
-        # Get monthly statistics
-        current_month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_users = User.query.filter(User.created_at >= current_month_start).count()
-        monthly_content = GeneratedContent.query.filter(GeneratedContent.created_at >= current_month_start).count()
-        
-        stats = {
-            'total_users': total_users,
-            'active_users': active_users,
-            'total_content_items': total_content_items,
-            'published_content': published_content,
-            'total_chat_sessions': total_chat_sessions,
-            'total_words': total_words,
-            'total_downloads': total_downloads,
-            'total_views': total_views,
-            'monthly_users': monthly_users,
-            'monthly_content': monthly_content
-        }
+        recent_content = GeneratedContent.query.options(selectinload(GeneratedContent.author))\
+            .order_by(GeneratedContent.created_at.desc()).limit(10).all()
         
         return render_template('admin/dashboard.html', 
                              stats=stats, 
@@ -123,9 +129,11 @@ def user_detail(user_id):
         chat_sessions = ChatSession.query.filter_by(user_id=user_id).order_by(ChatSession.created_at.desc()).limit(10).all()
         
         # Calculate user statistics
-        total_words = db.session.query(func.sum(GeneratedContent.word_count)).filter_by(user_id=user_id).scalar() or 0
-        total_downloads = db.session.query(func.sum(GeneratedContent.download_count)).filter_by(user_id=user_id).scalar() or 0
-        total_views = db.session.query(func.sum(GeneratedContent.view_count)).filter_by(user_id=user_id).scalar() or 0
+        total_words, total_downloads = db.session.query(
+            func.coalesce(func.sum(GeneratedContent.word_count), 0),
+            func.coalesce(func.sum(GeneratedContent.download_count), 0)
+        ).filter(GeneratedContent.user_id == user_id).one()
+        total_views = 0  # Content no longer has view tracking
         
         user_stats = {
             'total_content_items': len(content_items),
@@ -156,7 +164,8 @@ def content():
         search = request.args.get('search', '').strip()
         filter_type = request.args.get('filter', 'all')
         
-        query = GeneratedContent.query
+        # The listing shows each item's author; load them in one query, not one per row
+        query = GeneratedContent.query.options(selectinload(GeneratedContent.author))
         
         if search:
             query = query.filter(
@@ -250,13 +259,17 @@ def studio_detail(studio_name):
         base_query = ChatSession.query.filter(ChatSession.studio_type.in_(studio_types))
 
         # --- Overall Stats ---
-        total_sessions = base_query.count()
-        total_users = base_query.with_entities(ChatSession.user_id).distinct().count()
-
-        # Query for content linked to these chat sessions
-        content_query = GeneratedContent.query.join(ChatSession).filter(ChatSession.studio_type.in_(studio_types))
-        total_content_items = content_query.count()
-        total_words = db.session.query(func.sum(GeneratedContent.word_count)).join(ChatSession).filter(ChatSession.studio_type.in_(studio_types)).scalar() or 0
+        # One aggregate per table rather than a separate COUNT/SUM round-trip per number
+        total_sessions, total_users = db.session.query(
+            func.count(ChatSession.id),
+            func.count(ChatSession.user_id.distinct())
+        ).filter(ChatSession.studio_type.in_(studio_types)).one()
+
+        # Content linked to these chat sessions
+        total_content_items, total_words = db.session.query(
+            func.count(GeneratedContent.id),
+            func.coalesce(func.sum(GeneratedContent.word_count), 0)
+        ).join(ChatSession).filter(ChatSession.studio_type.in_(studio_types)).one()
 
         studio_stats = {
             'name': studio_name.replace('_', ' ').title(),
@@ -281,9 +294,18 @@ def studio_detail(studio_name):
             )
 
         # Paginate the content (chat sessions)
-        paginated_content = content_query.order_by(ChatSession.created_at.desc()).paginate(
-            page=page, per_page=20, error_out=False
-        )
+        paginated_content = content_query.options(selectinload(ChatSession.user))\
+            .order_by(ChatSession.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
+
+        # First content item of each session on the page, fetched together instead of
+        # a content_items.first() query per row in the template
+        session_ids = [session.id for session in paginated_content.items]
+        first_content_ids = dict(
+            db.session.query(GeneratedContent.chat_session_id, func.min(GeneratedContent.id))
+            .filter(GeneratedContent.chat_session_id.in_(session_ids))
+            .group_by(GeneratedContent.chat_session_id)
+            .all()
+        ) if session_ids else {}
 
         # --- Users Tab Query ---
         # Get top users by number of sessions in this studio
@@ -301,6 +323,7 @@ def studio_detail(studio_name):
         return render_template('admin/studio_detail.html',
                              studio=studio_stats,
                              content=paginated_content,
+                             first_content_ids=first_content_ids,
                              users=top_users_query,
                              search=search)
     except Exception as e:
@@ -422,13 +445,15 @@ def delete_content(content_id):
         
         # Delete associated chat session if it exists and no other content items reference it
         if content.chat_session_id:
-            other_content = GeneratedContent.query.filter(
-                GeneratedContent.chat_session_id == content.chat_session_id,
-                GeneratedContent.id != content_id
-            ).count()
+            has_other_content = db.session.query(
+                GeneratedContent.query.filter(
+                    GeneratedContent.chat_session_id == content.chat_session_id,
+                    GeneratedContent.id != content_id
+                ).exists()
+            ).scalar()
             
-            if other_content == 0:
-                chat_session = ChatSession.query.get(content.chat_session_id)
+            if not has_other_content:
+                chat_session = db.session.get(ChatSession, content.chat_session_id)
                 if chat_session:
                     db.session.delete(chat_session)
         
@@ -479,15 +504,29 @@ def toggle_content_public(content_id):
 def delete_session(session_id):
     """Delete a chat session and all associated content."""
     try:
-        session = ChatSession.query.get_or_404(session_id)
-        session_title = session.title
-        author_name = session.user.name
-
-        # Delete all content associated with this chat session
-        GeneratedContent.query.filter_by(chat_session_id=session.id).delete()
-
-        # Delete the chat session
-        db.session.delete(session)
+        # Title and author in one query, without loading the session into the ORM
+        row = db.session.execute(
+            select(ChatSession.title, User.name)
+            .join(User, ChatSession.user_id == User.id)
+            .where(ChatSession.id == session_id)
+        ).first()
+        if row is None:
+            return jsonify({'error': 'Session not found'}), 404
+        session_title, author_name = row
+
+        # Content is deleted explicitly: the FK's ON DELETE CASCADE covers Postgres
+        # (migrations.py upgrades older databases), but SQLite only enforces foreign
+        # keys when PRAGMA foreign_keys is on
+        db.session.execute(
+            delete(GeneratedContent)
+            .where(GeneratedContent.chat_session_id == session_id)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            delete(ChatSession)
+            .where(ChatSession.id == session_id)
+            .execution_options(synchronize_session=False)
+        )
         db.session.commit()
 
         logger.info(f"Admin {current_user.email} deleted session '{session_title}' by {author_name}")
@@ -508,16 +547,14 @@ def export_stats():
     """Export platform statistics"""
     try:
         # Get comprehensive statistics
+        current_month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        totals = get_platform_totals(current_month_start)
         stats = {
             'platform_overview': {
-                'total_users': User.query.count(),
-                'active_users': User.query.filter_by(is_active=True).count(),
-                'total_content_items': GeneratedContent.query.count(),
-                'published_content': GeneratedContent.query.filter_by(is_public=True).count(),
-                'total_chat_sessions': ChatSession.query.count(),
-                'total_words': db.session.query(func.sum(GeneratedContent.word_count)).scalar() or 0,
-                'total_downloads': db.session.query(func.sum(GeneratedContent.download_count)).scalar() or 0,
-                'total_views': db.session.query(func.sum(GeneratedContent.view_count)).scalar() or 0
+                key: totals[key] for key in (
+                    'total_users', 'active_users', 'total_content_items', 'published_content',
+                    'total_chat_sessions', 'total_words', 'total_downloads', 'total_views'
+                )
             },
             'monthly_stats': {},
             'user_activity': [],
@@ -561,15 +598,16 @@ def export_stats():
             })
         
         # Get content statistics
-        top_content = GeneratedContent.query.order_by(GeneratedContent.view_count.desc()).limit(10).all()
+        top_content = GeneratedContent.query.options(selectinload(GeneratedContent.author))\
+            .order_by(GeneratedContent.download_count.desc()).limit(10).all()
         for content in top_content:
             stats['content_stats'].append({
                 'title': content.title,
                 'author': content.author.name,
-                'view_count': content.view_count or 0,
+                'view_count': 0,
                 'download_count': content.download_count or 0,
                 'word_count': content.word_count or 0,
-                'is_public': content.is_public,
+                'is_public': False,
                 'created_at': content.created_at.isoformat() if content.created_at else None
             })
         
@@ -1,34 +1,43 @@
 import os
 import io
 import re
-import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import markdown
 import secrets
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash, session, abort
+import hashlib
+from html import escape
+from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash, session, abort, Response, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
-from bs4 import BeautifulSoup
-from docx import Document
-from docx.shared import Inches
 from google.api_core import exceptions as google_exceptions
 import vertexai
 from vertexai.generative_models import GenerativeModel
 from datetime import datetime, timedelta
-import json
 import logging
+import orjson
+from decimal import Decimal
 from sqlalchemy.exc import OperationalError, DatabaseError
-from sqlalchemy import func
+from sqlalchemy import and_, case, delete, func, or_, select, update
+from sqlalchemy.orm import load_only
 import time
+import random
+import threading
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache, TTLCache
+import queue
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from email.message import EmailMessage
 from urllib.parse import urlparse
 
 # Import our models and forms
-from models import db, User, GeneratedContent, ChatSession
+from models import db, User, GeneratedContent, ChatSession, BackgroundJob
 from forms import LoginForm, RegisterForm, ProfileForm, ChangePasswordForm
+from docx_builder import build_docx_file, docx_cache_key
 
 # Import admin blueprint
 from admin import admin_bp
@@ -38,7 +47,33 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- 1. INITIALIZATION & HELPERS ---
+class OrjsonProvider(JSONProvider):
+    """Serve jsonify() and request.get_json() through orjson"""
+    mimetype = "application/json"
+    option = orjson.OPT_NON_STR_KEYS
+
+    @staticmethod
+    def default(obj):
+        # Postgres returns SUM() aggregates as Decimal
+        if isinstance(obj, Decimal):
+            return int(obj) if obj == obj.to_integral_value() else float(obj)
+        if hasattr(obj, '__html__'):
+            return str(obj.__html__())
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # --- Environment-aware URL Configuration ---
 IS_PULL_REQUEST = os.getenv('IS_PULL_REQUEST') == 'true'
@@ -86,25 +121,51 @@ app.config['SESSION_COOKIE_SECURE'] = True
 app.register_blueprint(admin_bp)
 
 # Configuration
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(32))
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///inkdrive.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-# Engine options - conditionally add connect_args for PostgreSQL
+
+# Fix for Render PostgreSQL URLs (before the engine options check the scheme)
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres://'):
+    app.config['SQLALCHEMY_DATABASE_URI'] = app.config['SQLALCHEMY_DATABASE_URI'].replace('postgres://', 'postgresql://', 1)
+
+# A generated key differs per gunicorn worker, so sessions signed by one worker are
+# rejected by the others. Only local SQLite development may run without one.
+SECRET_KEY = os.getenv('SECRET_KEY')
+if not SECRET_KEY:
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        raise RuntimeError("SECRET_KEY must be set when running against PostgreSQL")
+    SECRET_KEY = secrets.token_hex(32)
+    logger.warning("SECRET_KEY not set; using a temporary key for local development")
+app.config['SECRET_KEY'] = SECRET_KEY
+
+# Engine options - conditionally add pool sizing and connect_args for PostgreSQL
 engine_options = {
     'pool_pre_ping': True,
     'pool_recycle': 300,
 }
 if 'postgresql' in app.config['SQLALCHEMY_DATABASE_URI']:
+    # Per worker process: one connection per gunicorn request thread, plus overflow
+    # for the background job threads. workers * (pool_size + max_overflow) must stay
+    # under the server's max_connections (48 with the gunicorn.conf.py defaults)
+    engine_options.update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', os.getenv('GUNICORN_THREADS', 8))),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', os.getenv('JOB_WORKERS', 4))),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        # Hand out the most recently used connection so bursts reuse warm connections
+        # and the surplus sits idle long enough for pool_recycle to retire it
+        'pool_use_lifo': True,
+    })
     engine_options['connect_args'] = {
         'connect_timeout': 10,
-        'sslmode': 'require'
+        'sslmode': 'require',
+        # TCP keepalives so dead connections are noticed instead of hanging a request
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 5
     }
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
 
-# Fix for Render PostgreSQL URLs
-if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres://'):
-    app.config['SQLALCHEMY_DATABASE_URI'] = app.config['SQLALCHEMY_DATABASE_URI'].replace('postgres://', 'postgresql://', 1)
-
 # Google OAuth Configuration
 app.config['GOOGLE_CLIENT_ID'] = os.getenv('GOOGLE_CLIENT_ID')
 app.config['GOOGLE_CLIENT_SECRET'] = os.getenv('GOOGLE_CLIENT_SECRET')
@@ -130,8 +191,20 @@ GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
 
 # Usage limits for free plan
 MONTHLY_WORD_LIMIT = 15000
+# Words reserved up front for a generation that doesn't ask for a length
+DEFAULT_WORD_ESTIMATE = 500
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+# Spaces and characters filesystems reject become underscores; control characters are dropped
+DOCX_FILENAME_TABLE = str.maketrans(
+    {**{char: '_' for char in ' /\\:*?"<>|'}, **{code: None for code in (*range(32), 127)}}
+)
+GENERATION_SAVE_ERROR = "Failed to save the generated content. Please try again."
+WORD_QUOTA_ERROR = f"You've reached your monthly limit of {MONTHLY_WORD_LIMIT} words. Please try again next month."
 MONTHLY_DOWNLOAD_LIMIT = 10
 
+# Largest page the listing endpoints return when a client pages with ?limit=/?cursor=
+MAX_PAGE_SIZE = 200
+
 # Initialize extensions
 db.init_app(app)
 login_manager = LoginManager()
@@ -143,22 +216,41 @@ login_manager.login_message_category = 'info'
 @login_manager.user_loader
 def load_user(user_id):
     try:
-        return User.query.get(int(user_id))
+        return db.session.get(User, int(user_id))
     except Exception as e:
         logger.error(f"Error loading user {user_id}: {e}")
         return None
 
 # Database connection retry decorator
+# SQLSTATEs worth retrying: serialization failure, deadlock and connection loss
+TRANSIENT_DB_ERROR_CODES = {'40001', '40P01', '08000', '08003', '08006'}
+
+def is_transient_db_error(e):
+    """Whether a failed statement could succeed if simply run again"""
+    if getattr(e, 'connection_invalidated', False):
+        return True
+    pgcode = getattr(e.orig, 'pgcode', None)
+    if pgcode:
+        return pgcode in TRANSIENT_DB_ERROR_CODES
+    # Without a SQLSTATE (e.g. SQLite's "database is locked"), only OperationalError is transient
+    return isinstance(e, OperationalError)
+
 def retry_db_operation(max_retries=3, delay=1):
     def decorator(func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
             for attempt in range(max_retries):
                 try:
                     return func(*args, **kwargs)
                 except (OperationalError, DatabaseError) as e:
+                    if not is_transient_db_error(e):
+                        logger.error(f"Database operation failed with a non-retryable error: {e}")
+                        raise
                     logger.warning(f"Database operation failed (attempt {attempt + 1}/{max_retries}): {e}")
                     if attempt < max_retries - 1:
-                        time.sleep(delay * (2 ** attempt))  # Exponential backoff
+                        db.session.rollback()
+                        # Capped, jittered exponential backoff so retries don't stampede
+                        time.sleep(min(delay * (2 ** attempt), 2.0) * (0.5 + random.random()))
                         continue
                     else:
                         logger.error(f"Database operation failed after {max_retries} attempts: {e}")
@@ -194,6 +286,129 @@ STUDIO_TYPE_MAPPING = {
     'webcopy': ['WEBCOPY'],
 }
 
+# Usage counters reported by /api/v1/studio/stats, mapped to the studio type they count
+STUDIO_STAT_KEYS = {
+    'social': {
+        'social_post_usage_this_month': 'SOCIAL_POST',
+        'email_usage_this_month': 'EMAIL',
+        'ad_copy_usage_this_month': 'AD_COPY',
+    },
+    'editing': {
+        'text_refinement_usage_this_month': 'TEXT_REFINEMENT',
+        'summary_usage_this_month': 'SUMMARY',
+        'translation_usage_this_month': 'TRANSLATION',
+    },
+    'repurpose': {
+        'repurpose_tweet_usage_this_month': 'REPURPOSE_TWEET',
+        'repurpose_slides_usage_this_month': 'REPURPOSE_SLIDES',
+    },
+    'seo': {
+        'seo_keywords_usage_this_month': 'SEO_KEYWORDS',
+        'seo_headlines_usage_this_month': 'SEO_HEADLINES',
+    },
+    'brainstorming': {'ideas_usage_this_month': 'IDEAS'},
+    'scriptwriting': {'script_usage_this_month': 'SCRIPT'},
+    'ecommerce': {'ecommerce_usage_this_month': 'ECOMMERCE'},
+    'webcopy': {'webcopy_usage_this_month': 'WEBCOPY'},
+    'business': {
+        'press_release_usage_this_month': 'PRESS_RELEASE',
+        'job_description_usage_this_month': 'JOB_DESCRIPTION',
+    },
+}
+
+# Shared HTTP session so image searches and downloads reuse keep-alive connections.
+# Image CDNs occasionally drop a connection, so transient failures get two quick retries.
+HTTP_SESSION = requests.Session()
+HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504))
+)
+HTTP_SESSION.mount('https://', HTTP_ADAPTER)
+HTTP_SESSION.mount('http://', HTTP_ADAPTER)
+
+# Google's ID-token signing certs, which id_token.verify_oauth2_token downloads on
+# every call. Google rotates them days apart, so an hour-old copy is safe.
+GOOGLE_CERTS_CACHE = TTLCache(maxsize=4, ttl=3600)
+GOOGLE_CERTS_CACHE_LOCK = threading.Lock()
+
+class CachingGoogleRequest(google_requests.Request):
+    """google-auth transport that reuses successful GET responses from GOOGLE_CERTS_CACHE"""
+
+    def __call__(self, url, method='GET', **kwargs):
+        if method != 'GET':
+            return super().__call__(url, method=method, **kwargs)
+
+        with GOOGLE_CERTS_CACHE_LOCK:
+            cached = GOOGLE_CERTS_CACHE.get(url)
+        if cached is not None:
+            return cached
+
+        response = super().__call__(url, method=method, **kwargs)
+        if response.status == 200:
+            with GOOGLE_CERTS_CACHE_LOCK:
+                GOOGLE_CERTS_CACHE[url] = response
+        return response
+
+GOOGLE_AUTH_REQUEST = CachingGoogleRequest(session=HTTP_SESSION)
+
+# Formatted article HTML keyed by a hash of the markdown. Formatting runs an image
+# search per placeholder, so re-rendering the same text is worth skipping.
+FORMATTED_ARTICLE_CACHE = LRUCache(maxsize=256)
+FORMATTED_ARTICLE_CACHE_LOCK = threading.Lock()
+
+# Markdown converters are costly to build (extension loading) and not thread-safe,
+# so idle ones are pooled per extension set and each is used by one request at a
+# time. A pool rather than threading.local, which is per greenlet under gevent.
+MARKDOWN_EXTENSIONS = ('fenced_code', 'tables')
+MARKDOWN_POOL = {}
+MARKDOWN_POOL_LOCK = threading.Lock()
+MARKDOWN_POOL_SIZE = 8
+
+# "[Image Placeholder: <title>, <alt text>]" markers the article prompt asks the model for.
+# Negated classes instead of lazy .*? so an unterminated marker fails in one scan rather
+# than backtracking through every later comma on the line.
+PLACEHOLDER_RE = re.compile(r"\[Image Placeholder: ([^,\n]*),\s*([^\]\n]*)\]")
+
+# Markup swapped in for each placeholder that found an image; fields are HTML-escaped
+# because the title and alt text come straight from model output
+IMAGE_CONTAINER_TEMPLATE = (
+    '<div class="real-image-container">'
+    '<p class="image-title">{title}</p>'
+    '<img src="{url}" alt="{alt}">'
+    '<p class="alt-text-display"><strong>Alt Text:</strong> {alt}</p>'
+    '<p class="source-link"><a href="{source}" target="_blank">Source</a></p>'
+    '</div>'
+)
+
+# Google image search results by query. Searches cost quota and up to 5s each, and
+# regenerated articles tend to ask for the same images again.
+IMAGE_SEARCH_CACHE = TTLCache(maxsize=2048, ttl=86400)
+IMAGE_SEARCH_CACHE_LOCK = threading.Lock()
+CACHE_MISS = object()
+IMAGE_SEARCH_WORKERS = 8
+GOOGLE_CSE_URL = "https://www.googleapis.com/customsearch/v1"
+GOOGLE_CSE_PARAMS = {"key": GOOGLE_API_KEY, "cx": GOOGLE_CSE_ID, "searchType": "image", "num": 1}
+
+# Per-user content totals (count, words, downloads) for the stats endpoints. Kept
+# for a minute and dropped whenever this process changes the user's content.
+CONTENT_TOTALS_CACHE = TTLCache(maxsize=1024, ttl=60)
+CONTENT_TOTALS_CACHE_LOCK = threading.Lock()
+
+# Background jobs run on the accepting worker's thread pool, but their state and
+# results live in the background_jobs table so any gunicorn worker can answer a
+# poll. Rows are kept for an hour; DOCX results over the size cap aren't stored.
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv('JOB_WORKERS', 4)))
+JOB_TTL = timedelta(hours=1)
+JOB_FILE_MAX_BYTES = 16 * 1024 * 1024
+
+# Outgoing mail is handed to one background thread so requests never wait on SMTP.
+# The thread keeps its login open between messages and closes it once idle.
+MAIL_QUEUE = queue.Queue()
+MAIL_IDLE_SECONDS = 60
+mail_worker_started = False
+mail_worker_lock = threading.Lock()
+
 # --- Initialize genai client with Vertex AI ---
 CLIENT = None
 try:
@@ -1047,64 +1262,463 @@ Localize the text now.
     return prompt
 
 
+# Tool registry for the multi-tool studios. Each tool names its prompt builder,
+# the top-level request fields passed to it (before settings), any settings it
+# cannot run without, how to title the session and how to shape the result.
+TOOL_HANDLERS = {
+    'social': {
+        'social_post': {
+            'prompt': construct_social_post_prompt,
+            'fields': ('topic', 'goal', 'platform'),
+            'missing_error': "Missing required fields for social post.",
+            'title': lambda data, settings: f"Social Posts for '{data.get('topic')}'",
+            'studio_type': 'SOCIAL_POST',
+            'result_key': 'posts',
+            'split': '---',
+        },
+        'email': {
+            'prompt': construct_email_prompt,
+            'fields': ('topic', 'audience', 'tone'),
+            'missing_error': "Missing required fields for email.",
+            'title': lambda data, settings: f"Email for '{data.get('topic')}'",
+            'studio_type': 'EMAIL',
+            'result_key': 'email_content',
+        },
+        'ad_copy': {
+            'prompt': construct_ad_copy_prompt,
+            'fields': ('product', 'audience'),
+            'missing_error': "Missing required fields for ad copy.",
+            'title': lambda data, settings: f"Ad Copy for {data.get('product')}",
+            'studio_type': 'AD_COPY',
+            'result_key': 'ad_copy',
+            'split': '---',
+        },
+    },
+    'brainstorming': {
+        'general': {
+            'prompt': construct_brainstorm_prompt,
+            'required_settings': ('goal',),
+            'missing_error': "Missing required field: goal.",
+            'title': lambda data, settings: f"Brainstorm: {settings.get('goal', 'General')}",
+            'studio_type': 'IDEAS',
+            'result_key': 'ideas',
+            'split': '\n',
+        },
+        'naming': {
+            'prompt': construct_naming_prompt,
+            'required_settings': ('description',),
+            'missing_error': "Missing required field: description.",
+            'title': lambda data, settings: f"Names for: {settings.get('description', 'New Project')[:30]}",
+            'studio_type': 'NAMING',
+            'result_key': 'names',
+            'split': '\n',
+        },
+    },
+    'editing': {
+        'tone_style': {
+            'prompt': construct_refine_text_prompt,
+            'fields': ('text',),
+            'missing_error': "Missing required fields: tool, text.",
+            'title': lambda data, settings: f"Refinement: {settings.get('goal', 'General')}",
+            'studio_type': 'TEXT_REFINEMENT',
+            'result_key': 'refined_text',
+        },
+        'summarize': {
+            'prompt': construct_summarizer_prompt,
+            'fields': ('text',),
+            'missing_error': "Missing required fields: tool, text.",
+            'title': lambda data, settings: f"Summary ({settings.get('format', 'paragraph')})",
+            'studio_type': 'SUMMARY',
+            'result_key': 'summary',
+        },
+        'translate': {
+            'prompt': construct_translator_prompt,
+            'fields': ('text',),
+            'missing_error': "Missing required fields: tool, text.",
+            'title': lambda data, settings: f"Translation to {settings.get('locale', 'Unknown')}",
+            'studio_type': 'TRANSLATION',
+            'result_key': 'translated_text',
+        },
+    },
+    'seo': {
+        'keyword_strategy': {
+            'prompt': construct_keyword_strategy_prompt,
+            'required_settings': ('description', 'audience'),
+            'missing_error': "Missing required fields for keyword strategy.",
+            'title': lambda data, settings: "Keyword Strategy",
+            'studio_type': 'SEO_KEYWORDS',
+            'result_key': 'keywords',
+            'parse': orjson.loads,
+            'parse_error': "Failed to parse the keyword data from the AI. Please try again.",
+        },
+        'on_page_audit': {
+            'prompt': construct_seo_audit_prompt,
+            'required_settings': ('url', 'primaryKeyword'),
+            'missing_error': "Missing required fields for on-page audit.",
+            'title': lambda data, settings: f"On-Page Audit for {settings.get('primaryKeyword')}",
+            'studio_type': 'SEO_AUDIT',
+            'result_key': 'audit_results',
+        },
+    },
+    'ecommerce': {
+        'description': {
+            'prompt': construct_product_description_prompt,
+            'title': lambda data, settings: f"Desc: {settings.get('productName', 'New Product')[:30]}",
+            'studio_type': 'ECOMMERCE',
+        },
+        'campaign': {
+            'prompt': construct_campaign_prompt,
+            'title': lambda data, settings: f"Campaign: {settings.get('occasion', 'New Event')[:30]}",
+            'studio_type': 'ECOMMERCE',
+        },
+        'review': {
+            'prompt': construct_review_response_prompt,
+            'title': lambda data, settings: f"Review Resp: {settings.get('review', 'New Review')[:30]}",
+            'studio_type': 'ECOMMERCE',
+        },
+    },
+    'webcopy': {
+        'landing_page': {
+            'prompt': construct_landing_page_prompt,
+            'title': lambda data, settings: f"LP: {settings.get('productName', 'New Page')[:30]}",
+            'studio_type': 'WEBCOPY',
+        },
+        'homepage_section': {
+            'prompt': construct_homepage_section_prompt,
+            'title': lambda data, settings: f"Homepage: {settings.get('sectionType', 'New Section')[:30]}",
+            'studio_type': 'WEBCOPY',
+        },
+        'usp': {
+            'prompt': construct_usp_prompt,
+            'title': lambda data, settings: f"USP for: {settings.get('productDesc', 'New Product')[:30]}",
+            'studio_type': 'WEBCOPY',
+        },
+    },
+    'business': {
+        # Note: The studio_type is generic 'BUSINESS' now, but could be made more specific
+        'proposal': {
+            'prompt': construct_proposal_prompt,
+            'title': lambda data, settings: f"Proposal for {settings.get('client', 'New Client')}",
+            'studio_type': 'BUSINESS',
+        },
+        'report': {
+            'prompt': construct_report_prompt,
+            'title': lambda data, settings: f"Report: {settings.get('subject', 'New Report')[:30]}",
+            'studio_type': 'BUSINESS',
+        },
+        'press_release': {
+            'prompt': construct_press_release_prompt,
+            'title': lambda data, settings: f"PR: {settings.get('headline', 'New Release')[:30]}",
+            'studio_type': 'BUSINESS',
+        },
+    },
+}
+
+def render_markdown(text, extensions=()):
+    """Convert markdown to HTML with a pooled converter"""
+    with MARKDOWN_POOL_LOCK:
+        idle = MARKDOWN_POOL.setdefault(extensions, [])
+        md = idle.pop() if idle else None
+    if md is None:
+        md = markdown.Markdown(extensions=list(extensions))
+
+    try:
+        return md.reset().convert(text)
+    finally:
+        with MARKDOWN_POOL_LOCK:
+            idle = MARKDOWN_POOL[extensions]
+            if len(idle) < MARKDOWN_POOL_SIZE:
+                idle.append(md)
+
 def get_image_url(query):
     if not GOOGLE_API_KEY or not GOOGLE_CSE_ID:
         logger.warning("Google Search API credentials not configured.")
         return None
 
-    api_url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": GOOGLE_API_KEY,
-        "cx": GOOGLE_CSE_ID,
-        "q": query,
-        "searchType": "image",
-        "num": 1
-    }
+    # Search is case-insensitive, so "A  Cat" and "a cat" share one lookup and cache entry
+    query = ' '.join(query.lower().split())
+    with IMAGE_SEARCH_CACHE_LOCK:
+        cached = IMAGE_SEARCH_CACHE.get(query, CACHE_MISS)
+    if cached is not CACHE_MISS:
+        return cached
+
     try:
-        response = requests.get(api_url, params=params, timeout=5)
+        response = HTTP_SESSION.get(GOOGLE_CSE_URL, params={**GOOGLE_CSE_PARAMS, "q": query}, timeout=5)
         response.raise_for_status()
         data = response.json()
+        image_data = None
         if "items" in data and len(data["items"]) > 0:
             item = data["items"][0]
-            return {"url": item["link"], "source": item["image"]["contextLink"]}
-        return None
+            image_data = {"url": item["link"], "source": item["image"]["contextLink"]}
+        # "No results" is cached too; request errors are not, so they get retried
+        with IMAGE_SEARCH_CACHE_LOCK:
+            IMAGE_SEARCH_CACHE[query] = image_data
+        return image_data
     except requests.RequestException as e:
         logger.error(f"Error fetching image from Google: {e}")
         return None
 
 def format_article_content(raw_markdown_text, topic=""):
-    """Format article content with images"""
-    hybrid_content = raw_markdown_text
-    placeholder_regex = re.compile(r"\[Image Placeholder: (.*?),\s*(.*?)\]")
+    """Format article content with images, reusing the result for text seen before"""
+    # The output depends only on the markdown, so topic is not part of the key
+    key = hashlib.blake2b(raw_markdown_text.encode('utf-8'), digest_size=16).digest()
+    with FORMATTED_ARTICLE_CACHE_LOCK:
+        cached_html = FORMATTED_ARTICLE_CACHE.get(key)
+    if cached_html is not None:
+        return cached_html
+
+    final_html, images_complete = render_article_content(raw_markdown_text)
+    # A lookup that failed (possibly a transient request error) must not pin its
+    # "Could not fetch image" fallback; the image search cache still answers repeats
+    if images_complete:
+        with FORMATTED_ARTICLE_CACHE_LOCK:
+            FORMATTED_ARTICLE_CACHE[key] = final_html
+    return final_html
+
+def render_article_content(raw_markdown_text):
+    """Replace image placeholders with fetched images and render the markdown to HTML.
 
-    for match in placeholder_regex.finditer(raw_markdown_text):
-        original_placeholder = match.group(0)
+    Returns (html, images_complete), where images_complete is False if any
+    placeholder fell back to the "Could not fetch image" text.
+    """
+    matches = list(PLACEHOLDER_RE.finditer(raw_markdown_text))
+
+    # Search each distinct alt text once, running the searches side by side
+    alt_texts = list(dict.fromkeys(match.group(2).strip() for match in matches))
+    if len(alt_texts) > 1:
+        with ThreadPoolExecutor(max_workers=min(IMAGE_SEARCH_WORKERS, len(alt_texts))) as executor:
+            lookups = dict(zip(alt_texts, executor.map(get_image_url, alt_texts)))
+    else:
+        lookups = {alt_text: get_image_url(alt_text) for alt_text in alt_texts}
+
+    def replace_placeholder(match):
         title = match.group(1).strip()
         alt_text = match.group(2).strip()
-        image_data = get_image_url(alt_text)
+        image_data = lookups[alt_text]
 
         if image_data:
-            new_image_tag = (
-                f'<div class="real-image-container">'
-                f'<p class="image-title">{title}</p>'
-                f'<img src="{image_data["url"]}" alt="{alt_text}">'
-                f'<p class="alt-text-display"><strong>Alt Text:</strong> {alt_text}</p>'
-                f'<p class="source-link"><a href="{image_data["source"]}" target="_blank">Source</a></p>'
-                f'</div>'
+            return IMAGE_CONTAINER_TEMPLATE.format(
+                title=escape(title, quote=False),
+                url=escape(image_data["url"]),
+                alt=escape(alt_text),
+                source=escape(image_data["source"])
             )
-            hybrid_content = hybrid_content.replace(original_placeholder, new_image_tag, 1)
+        return f'<p>[Image Placeholder: {escape(title, quote=False)} - Could not fetch image]</p>'
+
+    # One pass over the text instead of a full-string replace per placeholder
+    hybrid_content = PLACEHOLDER_RE.sub(replace_placeholder, raw_markdown_text) if matches else raw_markdown_text
+
+    final_html = render_markdown(hybrid_content, MARKDOWN_EXTENSIONS)
+    return final_html, all(lookups.values())
+
+def make_message_pair(user_content, ai_content):
+    """Build the user/AI message dicts stored on a chat session for one exchange"""
+    # Random rather than time-based, so two exchanges in the same second can't collide
+    exchange_id = secrets.token_hex(6)
+    return [
+        {"content": user_content, "isUser": True, "id": f"msg_{exchange_id}_user"},
+        {"content": ai_content, "isUser": False, "id": f"msg_{exchange_id}_ai"}
+    ]
+
+def new_chat_session_id(user_id):
+    """Build an id for a new chat session; nanoseconds keep same-second chats apart"""
+    return f"chat_{time.time_ns()}_{user_id}"
+
+def wants_event_stream():
+    """Check whether the client asked for a server-sent event stream"""
+    # An explicit ?stream= wins over the Accept header, so ?stream=0 forces JSON
+    stream = request.args.get('stream')
+    if stream is not None:
+        return stream in ('1', 'true')
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+def wants_background_job():
+    """Check whether the client asked for the work to run as a background job"""
+    return request.args.get('async') in ('1', 'true')
+
+def submit_job(func, *args):
+    """Queue func(*args) on the job pool and return a 202 pointing at its status URL"""
+    job_id = secrets.token_urlsafe(16)
+    now = datetime.utcnow()
+    # Expired jobs are cleared out as new ones arrive rather than by a separate sweeper
+    db.session.execute(
+        delete(BackgroundJob)
+        .where(BackgroundJob.created_at < now - JOB_TTL)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.add(BackgroundJob(
+        id=job_id,
+        user_id=current_user.id if current_user.is_authenticated else None,
+        created_at=now
+    ))
+    # Committed before the job is queued so the worker thread always finds the row
+    db.session.commit()
+    JOB_EXECUTOR.submit(run_job, job_id, func, args)
+    return jsonify({"job_id": job_id, "status_url": url_for('get_job', job_id=job_id)}), 202
+
+def run_job(job_id, func, args):
+    """Run a queued job inside an app context and record its (payload, status) result"""
+    with app.app_context():
+        try:
+            payload, status = func(*args)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Background job {job_id} failed: {e}")
+            payload, status = {"error": "The job failed unexpectedly."}, 500
+
+        file = payload.pop('file', None) if status < 400 else None
+        if file is not None and len(file) > JOB_FILE_MAX_BYTES:
+            file = None
+            payload, status = {"error": "The document is too large to hold for a background download. Download it directly instead."}, 413
+
+        try:
+            db.session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id)
+                .values(state="SUCCESS" if status < 400 else "FAILURE", status=status,
+                        result=app.json.dumps(payload), file=file)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to record result of background job {job_id}: {e}")
+
+def extract_response_text(response):
+    """Return the text of the first candidate, or None if the model returned nothing"""
+    if not response.candidates or not response.candidates[0].content.parts:
+        return None
+    return response.candidates[0].content.parts[0].text
+
+def format_sse(payload, event=None):
+    """Serialize a payload as a server-sent event frame"""
+    frame = f"event: {event}\n" if event else ""
+    return f"{frame}data: {orjson.dumps(payload).decode()}\n\n"
+
+def complete_generation(full_prompt, on_complete, error_label="Content generation error", user_id=None, reserved_words=0):
+    """Run the model to completion and return a (payload, status) pair"""
+    try:
+        response = CLIENT.generate_content(contents=full_prompt)
+        raw_text = extract_response_text(response)
+        if raw_text is None:
+            payload, status = {"error": "Model response was empty or blocked."}, 500
         else:
-            hybrid_content = hybrid_content.replace(original_placeholder, f'<p>[Image Placeholder: {title} - Could not fetch image]</p>', 1)
+            result = on_complete(raw_text)
+            payload, status = result if isinstance(result, tuple) else (result, 200)
+    except Exception as e:
+        logger.error(f"{error_label}: {e}")
+        payload, status = {"error": f"An unexpected error occurred: {str(e)}"}, 500
+
+    if status >= 400:
+        release_word_quota(user_id, reserved_words)
+    return payload, status
+
+def generate_and_respond(full_prompt, on_complete, error_label="Content generation error", user_id=None, reserved_words=0):
+    """Run the model and return its result as JSON, a server-sent event stream or a job.
+
+    on_complete receives the full raw text once the model has finished, persists it
+    and returns the payload for the client, or a (payload, status) tuple on failure.
+    Streaming clients get one `data:` frame per chunk followed by a `done` event
+    carrying that payload, or an `error` event. on_complete may run on a job thread,
+    so it must not touch current_user. Callers reserve words with reserve_word_quota
+    before calling this; on success on_complete settles the reservation against the
+    real word count, and any failure (or a streaming client disconnecting) releases it.
+    """
+    if wants_background_job():
+        return submit_job(complete_generation, full_prompt, on_complete, error_label, user_id, reserved_words)
 
-    final_html = markdown.markdown(hybrid_content, extensions=['fenced_code', 'tables'])
-    return final_html
+    if not wants_event_stream():
+        payload, status = complete_generation(full_prompt, on_complete, error_label, user_id, reserved_words)
+        return jsonify(payload), status
+
+    def stream():
+        chunks = []
+        settled = False
+        try:
+            for chunk in CLIENT.generate_content(contents=full_prompt, stream=True):
+                text = extract_response_text(chunk)
+                if text:
+                    chunks.append(text)
+                    yield format_sse({"text": text})
+
+            if not chunks:
+                yield format_sse({"error": "Model response was empty or blocked."}, event="error")
+                return
+
+            result = on_complete("".join(chunks))
+            if isinstance(result, tuple):
+                yield format_sse(result[0], event="error")
+            else:
+                settled = True
+                yield format_sse(result, event="done")
+        except Exception as e:
+            logger.error(f"{error_label}: {e}")
+            yield format_sse({"error": f"An unexpected error occurred: {str(e)}"}, event="error")
+        finally:
+            if not settled:
+                release_word_quota(user_id, reserved_words)
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def run_generation_tool(studio, data):
+    """Look up the requested tool in TOOL_HANDLERS, run it and persist the result"""
+    tool = data.get("tool")
+    settings = data.get("settings", {})
+    chat_session_id = data.get("chat_session_id")
+
+    spec = TOOL_HANDLERS[studio].get(tool)
+    if not spec:
+        return jsonify({"error": f"Unknown tool: {tool}"}), 400
+
+    values = [data.get(field) for field in spec.get('fields', ())]
+    if not all(values) or not all(settings.get(key) for key in spec.get('required_settings', ())):
+        return jsonify({"error": spec['missing_error']}), 400
+
+    reserved_words = reserve_word_quota(current_user, estimate_word_count(settings))
+    if reserved_words is None:
+        return jsonify({"error": f"You've reached your monthly word limit."}), 403
+
+    full_prompt = spec['prompt'](*values, settings)
+    session_title = spec['title'](data, settings)
+    user_id = current_user.id if current_user.is_authenticated else None
+
+    def on_complete(raw_text):
+        session_id = chat_session_id or new_chat_session_id(user_id)
+
+        result = raw_text
+        if spec.get('parse'):
+            try:
+                result = spec['parse'](raw_text)
+            except ValueError:
+                logger.error(f"Failed to parse {tool} output. Raw text: {raw_text}")
+                return {"error": spec['parse_error']}, 500
+        elif spec.get('split'):
+            result = [part.strip() for part in raw_text.split(spec['split']) if part.strip()]
+
+        # Guests can use some studios, but only signed-in users get history
+        if user_id:
+            user_message = orjson.dumps({"tool": tool, **dict(zip(spec.get('fields', ()), values)), "settings": settings}).decode()
+            messages = make_message_pair(user_message, raw_text)
+            content_id = save_generation(user_id, session_id, session_title, messages, raw_text,
+                                         spec['studio_type'], render_markdown(raw_text), reserved_words)
+            if content_id is None:
+                return {"error": GENERATION_SAVE_ERROR}, 500
+
+        return {spec.get('result_key', 'result'): result, "chat_session_id": session_id}
+
+    return generate_and_respond(full_prompt, on_complete, f"{studio.capitalize()} generation error for tool {tool}",
+                                user_id, reserved_words)
 
 @retry_db_operation(max_retries=3)
-def save_content_to_db(user_id, title, content_html, content_raw, is_refined=False, content_id=None, chat_session_id=None):
+def save_content_to_db(user_id, title, content_html, content_raw, is_refined=False, content_id=None, chat_session_id=None, word_count=None):
     """Save content to database with retry logic"""
     try:
-        # Extract word count (rough estimate)
-        word_count = len(content_raw.split())
+        # Extract word count (rough estimate) unless the caller already counted for the quota
+        if word_count is None:
+            word_count = len(content_raw.split())
 
         if content_id:
             # Update existing content
@@ -1133,20 +1747,25 @@ def save_content_to_db(user_id, title, content_html, content_raw, is_refined=Fal
 
             db.session.add(content)
 
-            # Update user's article count and monthly word count
-            user = User.query.get(user_id)
-            if user:
-                user.articles_generated = (user.articles_generated or 0) + 1
-
-                # Check if we need to reset monthly quotas
-                if user.last_quota_reset is None or (datetime.utcnow() - user.last_quota_reset) > timedelta(days=30):
-                    user.words_generated_this_month = word_count
-                    user.downloads_this_month = 0
-                    user.last_quota_reset = datetime.utcnow()
-                else:
-                    user.words_generated_this_month = (user.words_generated_this_month or 0) + word_count
+            # Update user's article count (callers record the monthly words with
+            # record_word_usage) and start a new quota period if the old one lapsed,
+            # all in one UPDATE so concurrent saves can't lose increments
+            now = datetime.utcnow()
+            quota_stale = or_(User.last_quota_reset.is_(None), User.last_quota_reset < now - timedelta(days=30))
+            db.session.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(
+                    articles_generated=func.coalesce(User.articles_generated, 0) + 1,
+                    words_generated_this_month=case((quota_stale, word_count), else_=User.words_generated_this_month),
+                    downloads_this_month=case((quota_stale, 0), else_=User.downloads_this_month),
+                    last_quota_reset=case((quota_stale, now), else_=User.last_quota_reset)
+                )
+                .execution_options(synchronize_session=False)
+            )
 
         db.session.commit()
+        invalidate_content_totals(user_id)
         return content.id
     except Exception as e:
         db.session.rollback()
@@ -1154,8 +1773,12 @@ def save_content_to_db(user_id, title, content_html, content_raw, is_refined=Fal
         return None
 
 @retry_db_operation(max_retries=3)
-def save_chat_session_to_db(user_id, session_id, title, messages, raw_text='', studio_type='ARTICLE'):
-    """Save or update chat session to database"""
+def save_chat_session_to_db(user_id, session_id, title, messages, raw_text='', studio_type='ARTICLE', commit=True):
+    """Save or update chat session to database.
+
+    Pass commit=False when the caller saves related content straight after; the
+    session is flushed so its id is available and the caller's commit covers both.
+    """
     try:
         # Check if chat session exists
         chat_session = ChatSession.query.filter_by(session_id=session_id, user_id=user_id).first()
@@ -1179,46 +1802,200 @@ def save_chat_session_to_db(user_id, session_id, title, messages, raw_text='', s
             chat_session.set_messages(messages)
             db.session.add(chat_session)
 
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
         return chat_session.id
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error saving chat session: {e}")
         return None
 
+def get_content_totals(user_id):
+    """Return (items, words, downloads) for a user's content in one query, cached briefly"""
+    with CONTENT_TOTALS_CACHE_LOCK:
+        totals = CONTENT_TOTALS_CACHE.get(user_id)
+    if totals is None:
+        totals = tuple(db.session.query(
+            func.count(GeneratedContent.id),
+            func.coalesce(func.sum(GeneratedContent.word_count), 0),
+            func.coalesce(func.sum(GeneratedContent.download_count), 0)
+        ).filter(GeneratedContent.user_id == user_id).one())
+        with CONTENT_TOTALS_CACHE_LOCK:
+            CONTENT_TOTALS_CACHE[user_id] = totals
+    return totals
+
+def parse_page_cursor(cursor):
+    """Split a '<iso timestamp>,<id>' listing cursor; raises ValueError if malformed"""
+    timestamp, row_id = cursor.rsplit(',', 1)
+    return datetime.fromisoformat(timestamp), int(row_id)
+
+def requested_page_size():
+    """Page size from ?limit=, clamped to 1..MAX_PAGE_SIZE.
+
+    Returns None when the request gives neither a limit nor a cursor, so callers
+    that don't page (like the sidebar) still get the full list.
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return MAX_PAGE_SIZE if request.args.get('cursor') else None
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def make_page_cursor(timestamp, row_id):
+    """Build the cursor for the row after which the next page starts"""
+    return f"{timestamp.isoformat()},{row_id}" if timestamp else None
+
+def keyset_after(sort_column, id_column, cursor):
+    """WHERE clause selecting rows that sort after the cursor in (sort_column, id) DESC order"""
+    timestamp, row_id = parse_page_cursor(cursor)
+    return or_(sort_column < timestamp, and_(sort_column == timestamp, id_column < row_id))
+
+def record_download(content_id, user_id):
+    """Bump a content item's download count and its owner's monthly downloads in one transaction.
+
+    Both counters are incremented in SQL so concurrent downloads can't overwrite
+    each other. Returns False when the content doesn't belong to the user.
+    """
+    result = db.session.execute(
+        update(GeneratedContent)
+        .where(GeneratedContent.id == content_id, GeneratedContent.user_id == user_id)
+        .values(download_count=func.coalesce(GeneratedContent.download_count, 0) + 1)
+    )
+    if result.rowcount == 0:
+        db.session.rollback()
+        return False
+
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(downloads_this_month=func.coalesce(User.downloads_this_month, 0) + 1)
+    )
+    db.session.commit()
+    invalidate_content_totals(user_id)
+    return True
+
+def invalidate_content_totals(user_id):
+    """Drop a user's cached content totals after their content changes"""
+    with CONTENT_TOTALS_CACHE_LOCK:
+        CONTENT_TOTALS_CACHE.pop(user_id, None)
+
+def record_word_usage(user_id, word_count):
+    """Add words to the user's monthly total, or take them off when word_count is negative.
+
+    Generations settle their reservation through this once the real word count
+    is known, so the total can end up past the limit when the model overshoots
+    the estimate. Never drops below zero. Runs in the caller's transaction.
+    """
+    words = func.coalesce(User.words_generated_this_month, 0) + word_count
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(words_generated_this_month=case((words < 0, 0), else_=words))
+        .execution_options(synchronize_session=False)
+    )
+
+def estimate_word_count(settings):
+    """Words to reserve for a generation: the requested length, or a default for tools without one"""
+    try:
+        estimate = int((settings or {}).get('wordCount', DEFAULT_WORD_ESTIMATE))
+    except (AttributeError, TypeError, ValueError):
+        estimate = DEFAULT_WORD_ESTIMATE
+    return max(1, min(estimate, MONTHLY_WORD_LIMIT))
+
 @retry_db_operation(max_retries=2)
-def check_monthly_word_quota(user):
-    """Check if user has exceeded monthly word quota"""
+def reserve_word_quota(user, estimate):
+    """Reserve words from the user's monthly quota before a generation starts.
+
+    The limit check and the reservation are one conditional UPDATE, so concurrent
+    generations can't all pass against the same total. Returns the number of
+    words reserved, or None if they don't fit in what's left of the quota. Guests
+    reserve nothing, and a failed check lets the generation through unreserved.
+    """
+    if not user.is_authenticated:
+        return 0
+
     try:
-        # Reset quota if it's been more than 30 days
-        if user.last_quota_reset is None or (datetime.utcnow() - user.last_quota_reset) > timedelta(days=30):
-            user.words_generated_this_month = 0
-            user.downloads_this_month = 0
-            user.last_quota_reset = datetime.utcnow()
-            db.session.commit()
-            return True
+        refresh_quotas_if_stale(user)
+        words = func.coalesce(User.words_generated_this_month, 0)
+        result = db.session.execute(
+            update(User)
+            .where(User.id == user.id, words + estimate <= MONTHLY_WORD_LIMIT)
+            .values(words_generated_this_month=words + estimate)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error reserving word quota for user {user.id}: {e}")
+        return 0  # Allow operation if the reservation fails
 
-        words_generated = user.words_generated_this_month or 0
-        return words_generated < MONTHLY_WORD_LIMIT
+    return estimate if result.rowcount == 1 else None
+
+def release_word_quota(user_id, reserved_words):
+    """Give back a reservation whose generation failed or was abandoned"""
+    if not user_id or not reserved_words:
+        return
+
+    try:
+        record_word_usage(user_id, -reserved_words)
+        db.session.commit()
     except Exception as e:
-        logger.error(f"Error checking word quota for user {user.id}: {e}")
-        return True  # Allow operation if check fails
+        db.session.rollback()
+        logger.error(f"Error releasing reserved words for user {user_id}: {e}")
+
+def save_generation(user_id, session_id, title, messages, raw_text, studio_type, content_html, reserved_words=0):
+    """Save a finished generation's chat session, word usage and content in one transaction.
+
+    The words reserved up front are settled against the real word count. Returns
+    the new content id, or None if any part failed, in which case the transaction
+    is rolled back and nothing is saved (the caller releases the reservation).
+    """
+    word_count = len(raw_text.split())
+    db_chat_session_id = save_chat_session_to_db(user_id, session_id, title, messages, raw_text, studio_type=studio_type, commit=False)
+    if db_chat_session_id is None:
+        return None  # Already rolled back
+
+    try:
+        record_word_usage(user_id, word_count - reserved_words)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recording word usage: {e}")
+        return None
+
+    # Commits the chat session and word usage along with the content
+    return save_content_to_db(user_id, title, content_html, raw_text, chat_session_id=db_chat_session_id, word_count=word_count)
+
+def refresh_quotas_if_stale(user):
+    """Reset the user's monthly counters once the 30-day quota period has passed.
+
+    The reset is a single conditional UPDATE, so two requests racing past the
+    period boundary can't both reset and wipe usage recorded in between. Returns
+    True if this call performed the reset.
+    """
+    now = datetime.utcnow()
+    if user.last_quota_reset is not None and (now - user.last_quota_reset) <= timedelta(days=30):
+        return False
+
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user.id,
+               or_(User.last_quota_reset.is_(None), User.last_quota_reset < now - timedelta(days=30)))
+        .values(words_generated_this_month=0, downloads_this_month=0, last_quota_reset=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
 
 @retry_db_operation(max_retries=2)
 def check_monthly_download_quota(user):
     """Check if user has exceeded monthly download quota"""
     try:
-        # Reset quota if it's been more than 30 days
-        if user.last_quota_reset is None or (datetime.utcnow() - user.last_quota_reset) > timedelta(days=30):
-            user.words_generated_this_month = 0
-            user.downloads_this_month = 0
-            user.last_quota_reset = datetime.utcnow()
-            db.session.commit()
-            return True
-
+        refresh_quotas_if_stale(user)
         downloads_this_month = user.downloads_this_month or 0
         return downloads_this_month < MONTHLY_DOWNLOAD_LIMIT
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error checking download quota for user {user.id}: {e}")
         return True  # Allow operation if check fails
 
@@ -1260,7 +2037,7 @@ def send_contact_email(name, email, subject, message):
             logger.warning("Email credentials not configured")
             return False
 
-        msg = MIMEMultipart()
+        msg = EmailMessage()
         msg['From'] = app.config['MAIL_USERNAME']
         msg['To'] = app.config['CONTACT_EMAIL']
         msg['Subject'] = f"InkDrive Contact Form: {subject}"
@@ -1279,22 +2056,116 @@ Message:
 This message was sent from the InkDrive contact form.
         """
 
-        msg.attach(MIMEText(body, 'plain'))
-
-        server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
-        server.starttls()
-        server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        text = msg.as_string()
-        server.sendmail(app.config['MAIL_USERNAME'], app.config['CONTACT_EMAIL'], text)
-        server.quit()
+        msg.set_content(body)
 
+        queue_mail(msg)
         return True
     except Exception as e:
         logger.error(f"Error sending contact email: {e}")
         return False
 
+def queue_mail(msg):
+    """Hand a message to the mail thread, starting it on first use"""
+    global mail_worker_started
+    with mail_worker_lock:
+        if not mail_worker_started:
+            threading.Thread(target=mail_worker, name='mail-worker', daemon=True).start()
+            mail_worker_started = True
+    MAIL_QUEUE.put(msg)
+
+def open_smtp_connection():
+    """Connect and log in to the configured SMTP server"""
+    server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'], timeout=30)
+    server.starttls()
+    server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+    return server
+
+def close_smtp_connection(server):
+    """Log out of an SMTP connection, ignoring servers that already hung up"""
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+def mail_worker():
+    """Send queued messages over one reused SMTP connection, reconnecting when it drops"""
+    server = None
+    while True:
+        try:
+            msg = MAIL_QUEUE.get(timeout=MAIL_IDLE_SECONDS)
+        except queue.Empty:
+            if server is not None:
+                close_smtp_connection(server)
+                server = None
+            continue
+
+        try:
+            for attempt in range(2):
+                try:
+                    if server is None:
+                        server = open_smtp_connection()
+                    server.send_message(msg)
+                    break
+                except smtplib.SMTPServerDisconnected:
+                    # The server closed our idle connection; log in again and retry once
+                    server = None
+                    if attempt:
+                        raise
+        except Exception as e:
+            logger.error(f"Error sending email to {msg['To']}: {e}")
+            if server is not None:
+                close_smtp_connection(server)
+                server = None
+        finally:
+            MAIL_QUEUE.task_done()
+
+def fetch_image_bytes(url):
+    """Download an image for a DOCX export, returning None if it fails"""
+    try:
+        response = HTTP_SESSION.get(url, timeout=10)
+        response.raise_for_status()
+        return response.content
+    except requests.RequestException:
+        return None
+
+def docx_filename(title):
+    """Attachment filename for a DOCX export of title"""
+    return f"{title[:50].translate(DOCX_FILENAME_TABLE).strip('_') or 'document'}.docx"
+
+def docx_etag(html_content, title):
+    """ETag for the DOCX built from this title and HTML.
+
+    Derived from the source rather than the file bytes, so it is the same in every
+    worker, survives DOCX_CACHE evictions and can be checked without building anything.
+    """
+    return docx_cache_key(html_content, title).hex()
+
+def send_docx(docx_bytes, filename, etag, last_modified=None):
+    """Send a DOCX as an attachment with its ETag, so a GET revalidating an unchanged file gets a 304"""
+    return send_file(io.BytesIO(docx_bytes), as_attachment=True, download_name=filename,
+                     mimetype=DOCX_MIMETYPE, etag=etag, last_modified=last_modified, conditional=True)
+
+def render_docx_job(html_content, title, filename):
+    """Job wrapper around build_docx_file that returns a (payload, status) pair"""
+    try:
+        return {"file": build_docx_file(html_content, title, fetch_image_bytes), "filename": filename,
+                "etag": docx_etag(html_content, title)}, 200
+    except Exception as e:
+        logger.error(f"DOCX generation error: {e}")
+        return {"error": "Failed to generate document."}, 500
+
 # --- 2. SUBDOMAIN ROUTING & PRE-REQUEST LOGIC ---
 
+# Endpoints that cannot do anything without the Gemini client
+AI_ENDPOINT_PREFIXES = ('/api/v1/generate/', '/api/v1/refine/', '/api/v1/repurpose/', '/api/v1/seo/')
+
+@app.before_request
+def require_ai_client():
+    """Fail AI endpoints fast when the model client is not configured."""
+    # Registered first so the session, login and routing work below is skipped
+    if not CLIENT and request.path.startswith(AI_ENDPOINT_PREFIXES):
+        return jsonify({"error": "AI service is not available."}), 503
+
 @app.before_request
 def subdomain_routing():
     """Handle routing rules based on subdomain and authentication status."""
@@ -1330,7 +2201,7 @@ def subdomain_routing():
     # Rule: Authenticated user on the main domain -> redirect to the studio domain
     if not is_studio_domain and is_authenticated:
         # Exceptions: Allow authenticated users to access these endpoints on the main domain
-        allowed_endpoints = ['auth_logout', 'share_article', 'contact', 'privacy_policy', 'terms_of_service', 'support', 'download_docx', 'api_download_article']
+        allowed_endpoints = ['auth_logout', 'share_article', 'contact', 'privacy_policy', 'terms_of_service', 'support', 'download_docx', 'api_download_article', 'get_job']
         if request.endpoint in allowed_endpoints:
             return # Do not redirect
 
@@ -1480,7 +2351,7 @@ def auth_google_callback():
         # Verify the token
         idinfo = id_token.verify_oauth2_token(
             token,
-            google_requests.Request(),
+            GOOGLE_AUTH_REQUEST,
             app.config['GOOGLE_CLIENT_ID']
         )
 
@@ -1623,15 +2494,24 @@ def profile_change_password():
 def profile_delete_account():
     """Delete user account"""
     try:
-        # Delete all user's content
-        GeneratedContent.query.filter_by(user_id=current_user.id).delete()
-
-        # Delete all user's chat sessions
-        ChatSession.query.filter_by(user_id=current_user.id).delete()
-
-        # Delete the user
-        db.session.delete(current_user)
+        # Set-based deletes without synchronizing the session: nothing loaded for this
+        # user is reused afterwards. Deleting the user with a statement too avoids the
+        # ORM cascade loading both collections just to find them already empty.
+        user_id = current_user.id
+        db.session.execute(
+            delete(GeneratedContent).where(GeneratedContent.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            delete(ChatSession).where(ChatSession.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            delete(User).where(User.id == user_id)
+            .execution_options(synchronize_session=False)
+        )
         db.session.commit()
+        invalidate_content_totals(user_id)
 
         logout_user()
         flash('Your account has been deleted successfully.', 'success')
@@ -1652,12 +2532,25 @@ def profile_delete_account():
 def profile_content():
     """View all user content"""
     try:
-        page = request.args.get('page', 1, type=int)
-        content_items = GeneratedContent.query.filter_by(user_id=current_user.id)\
-                               .order_by(GeneratedContent.created_at.desc())\
-                               .paginate(page=page, per_page=20, error_out=False)
+        cursor = request.args.get('cursor')
+        per_page = 20
 
-        return render_template('profile/content.html', content_items=content_items)
+        query = GeneratedContent.query.filter_by(user_id=current_user.id)
+        if cursor:
+            try:
+                query = query.filter(keyset_after(GeneratedContent.created_at, GeneratedContent.id, cursor))
+            except ValueError:
+                return redirect(url_for('profile_content'))
+
+        # Keyset paging: one extra row tells us whether there is a next page without a COUNT
+        content_items = query.order_by(GeneratedContent.created_at.desc(), GeneratedContent.id.desc())\
+                             .limit(per_page + 1).all()
+        next_cursor = None
+        if len(content_items) > per_page:
+            content_items = content_items[:per_page]
+            next_cursor = make_page_cursor(content_items[-1].created_at, content_items[-1].id)
+
+        return render_template('profile/content.html', content_items=content_items, next_cursor=next_cursor)
     except (OperationalError, DatabaseError) as e:
         logger.error(f"Database error loading content: {e}")
         flash('Database connection issue loading content.', 'error')
@@ -1736,18 +2629,35 @@ def unpublish_content(content_id):
 @login_required
 def delete_content(content_id):
     """Delete a content item and its associated chat session"""
+    user_id = current_user.id
     try:
-        content = GeneratedContent.query.filter_by(id=content_id, user_id=current_user.id).first_or_404()
-
-        # Find and delete associated chat session if it exists
-        if content.chat_session_id:
-            chat_session = ChatSession.query.filter_by(id=content.chat_session_id, user_id=current_user.id).first()
-            if chat_session:
-                db.session.delete(chat_session)
-
-        # Delete the content
-        db.session.delete(content)
+        # Delete the content first and learn its chat session from the same statement
+        deleted = db.session.execute(
+            delete(GeneratedContent)
+            .where(GeneratedContent.id == content_id, GeneratedContent.user_id == user_id)
+            .returning(GeneratedContent.chat_session_id)
+        ).first()
+        if deleted is None:
+            db.session.rollback()
+            return jsonify({"error": "Content not found"}), 404
+
+        chat_session_id = deleted.chat_session_id
+        if chat_session_id:
+            # Other content from the same chat is kept, just unlinked, as the FK
+            # would otherwise cascade the session delete onto it
+            db.session.execute(
+                update(GeneratedContent)
+                .where(GeneratedContent.chat_session_id == chat_session_id)
+                .values(chat_session_id=None)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                delete(ChatSession)
+                .where(ChatSession.id == chat_session_id, ChatSession.user_id == user_id)
+                .execution_options(synchronize_session=False)
+            )
         db.session.commit()
+        invalidate_content_totals(user_id)
 
         return jsonify({
             "success": True,
@@ -1803,15 +2713,7 @@ def index():
     if current_user.is_authenticated:
         return render_template("dashboard.html", user=current_user, page_type='dashboard')
     else:
-        # Get random published content for social proof
-        try:
-            # Use a simpler query that works with both SQLite and PostgreSQL
-            featured_content = GeneratedContent.query.filter_by(is_public=True).limit(6).all()
-        except Exception as e:
-            logger.warning(f"Error fetching featured content for landing: {e}")
-            featured_content = []
-
-        return render_template("landing.html", featured_articles=featured_content)
+        return render_template("landing.html")
 
 @app.route('/article')
 @login_required
@@ -1877,188 +2779,26 @@ def business_studio():
 @login_required
 def generate_social_content():
     """Handles various social and communication content generation requests."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
-    tool = data.get("tool")
-    settings = data.get("settings", {})
-    chat_session_id = data.get("chat_session_id")
-
-    if not tool:
+    if not data.get("tool"):
         return jsonify({"error": "Missing required field: tool."}), 400
 
-    if not check_monthly_word_quota(current_user):
-        return jsonify({"error": f"You've reached your monthly word limit."}), 403
-
-    if tool == 'social_post':
-        topic = data.get("topic")
-        goal = data.get("goal")
-        platform = data.get("platform")
-        if not all([topic, goal, platform]):
-            return jsonify({"error": "Missing required fields for social post."}), 400
-
-        full_prompt = construct_social_post_prompt(topic, goal, platform, settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            raw_text = response.candidates[0].content.parts[0].text
-            posts = [p.strip() for p in raw_text.split('---') if p.strip()]
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "social_post", "topic": topic, "goal": goal, "platform": platform, "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": raw_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"Social Posts for '{topic}'"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, raw_text, studio_type='SOCIAL_POST')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(raw_text)
-            save_content_to_db(current_user.id, session_title, content_html, raw_text, chat_session_id=db_chat_session_id)
-
-            return jsonify({"posts": posts, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"Social post generation error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    elif tool == 'email':
-        topic = data.get("topic")
-        audience = data.get("audience")
-        tone = data.get("tone")
-        if not all([topic, audience, tone]):
-            return jsonify({"error": "Missing required fields for email."}), 400
-
-        full_prompt = construct_email_prompt(topic, audience, tone, settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            raw_text = response.candidates[0].content.parts[0].text
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "email", "topic": topic, "audience": audience, "tone": tone, "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": raw_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"Email for '{topic}'"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, raw_text, studio_type='EMAIL')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(raw_text)
-            save_content_to_db(current_user.id, session_title, content_html, raw_text, chat_session_id=db_chat_session_id)
-
-            return jsonify({"email_content": raw_text, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"Email generation error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    elif tool == 'ad_copy':
-        product = data.get("product")
-        audience = data.get("audience")
-        if not all([product, audience]):
-            return jsonify({"error": "Missing required fields for ad copy."}), 400
-
-        full_prompt = construct_ad_copy_prompt(product, audience, settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            raw_text = response.candidates[0].content.parts[0].text
-            ad_copy = [ad.strip() for ad in raw_text.split('---') if ad.strip()]
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "ad_copy", "product": product, "audience": audience, "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": raw_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"Ad Copy for {product}"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, raw_text, studio_type='AD_COPY')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(raw_text)
-            save_content_to_db(current_user.id, session_title, content_html, raw_text, chat_session_id=db_chat_session_id)
-
-            return jsonify({"ad_copy": ad_copy, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"Ad copy generation error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    else:
-        return jsonify({"error": f"Unknown tool: {tool}"}), 400
+    return run_generation_tool('social', data)
 
 @app.route('/api/v1/generate/brainstorm', methods=['POST'])
 @login_required
 def generate_brainstorm_content():
     """Handles various brainstorming and naming requests."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
-    tool = data.get("tool")
-    settings = data.get("settings", {})
-    chat_session_id = data.get("chat_session_id")
-
-    if not tool:
+    if not data.get("tool"):
         return jsonify({"error": "Missing required field: tool."}), 400
 
-    if not check_monthly_word_quota(current_user):
-        return jsonify({"error": f"You've reached your monthly word limit."}), 403
-
-    if tool == 'general':
-        if not settings.get('goal'):
-            return jsonify({"error": "Missing required field: goal."}), 400
-
-        full_prompt = construct_brainstorm_prompt(settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            raw_text = response.candidates[0].content.parts[0].text
-            ideas = [idea.strip() for idea in raw_text.split('\n') if idea.strip()]
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "general", "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": raw_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"Brainstorm: {settings.get('goal', 'General')}"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, raw_text, studio_type='IDEAS')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(raw_text)
-            save_content_to_db(current_user.id, session_title, content_html, raw_text, chat_session_id=db_chat_session_id)
-
-            return jsonify({"ideas": ideas, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"Brainstorming error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    elif tool == 'naming':
-        if not settings.get('description'):
-            return jsonify({"error": "Missing required field: description."}), 400
-
-        full_prompt = construct_naming_prompt(settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            raw_text = response.candidates[0].content.parts[0].text
-            names = [name.strip() for name in raw_text.split('\n') if name.strip()]
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "naming", "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": raw_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"Names for: {settings.get('description', 'New Project')[:30]}"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, raw_text, studio_type='NAMING')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(raw_text)
-            save_content_to_db(current_user.id, session_title, content_html, raw_text, chat_session_id=db_chat_session_id)
-
-            return jsonify({"names": names, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"Naming error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    else:
-        return jsonify({"error": f"Unknown tool: {tool}"}), 400
+    return run_generation_tool('brainstorming', data)
 
 @app.route('/api/v1/generate/script', methods=['POST'])
 @login_required
 def generate_script():
     """Generates a script based on detailed user settings."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
     topic = data.get("topic")
     settings = data.get("settings", {})
@@ -2067,223 +2807,68 @@ def generate_script():
     if not topic:
         return jsonify({"error": "Missing required field: topic."}), 400
 
-    if not check_monthly_word_quota(current_user):
+    reserved_words = reserve_word_quota(current_user, estimate_word_count(settings))
+    if reserved_words is None:
         return jsonify({"error": f"You've reached your monthly word limit."}), 403
 
-    full_prompt = construct_script_prompt(topic, settings)
-    try:
-        response = CLIENT.generate_content(contents=full_prompt)
-        script_text = response.candidates[0].content.parts[0].text
+    # Save to chat history
+    if not chat_session_id:
+        chat_session_id = new_chat_session_id(current_user.id)
 
-        # Save to chat history
-        if not chat_session_id:
-            chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
+    full_prompt = construct_script_prompt(topic, settings)
+    user_id = current_user.id
 
+    def on_complete(script_text):
         # Store the original user request (topic and all settings) for session restoration
-        user_message = json.dumps({"topic": topic, "settings": settings})
-        messages = [
-            {"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"},
-            {"content": script_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}
-        ]
+        user_message = orjson.dumps({"topic": topic, "settings": settings}).decode()
+        messages = make_message_pair(user_message, script_text)
 
         session_title = f"Script: {topic[:40]}{'...' if len(topic) > 40 else ''}"
-        db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, script_text, studio_type='SCRIPT')
-
-        # Save generated content to the database
-        content_html = markdown.markdown(script_text)
-        save_content_to_db(current_user.id, session_title, content_html, script_text, chat_session_id=db_chat_session_id)
+        content_id = save_generation(user_id, chat_session_id, session_title, messages, script_text,
+                                     'SCRIPT', render_markdown(script_text), reserved_words)
+        if content_id is None:
+            return {"error": GENERATION_SAVE_ERROR}, 500
 
-        return jsonify({
+        return {
             "script": script_text,
             "chat_session_id": chat_session_id
-        })
-    except Exception as e:
-        logger.error(f"Script generation error: {e}")
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+        }
+
+    return generate_and_respond(full_prompt, on_complete, "Script generation error", user_id, reserved_words)
 
 @app.route('/api/v1/generate/ecommerce', methods=['POST'])
 @login_required
 def generate_ecommerce():
     """Handles various e-commerce content generation requests."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
-    tool = data.get("tool")
-    settings = data.get("settings", {})
-    chat_session_id = data.get("chat_session_id")
-
-    if not tool:
+    if not data.get("tool"):
         return jsonify({"error": "Missing required field: tool."}), 400
 
-    if not check_monthly_word_quota(current_user):
-        return jsonify({"error": f"You've reached your monthly word limit."}), 403
-
-    # Route to the correct prompt constructor based on the tool
-    if tool == 'description':
-        full_prompt = construct_product_description_prompt(settings)
-        session_title = f"Desc: {settings.get('productName', 'New Product')[:30]}"
-    elif tool == 'campaign':
-        full_prompt = construct_campaign_prompt(settings)
-        session_title = f"Campaign: {settings.get('occasion', 'New Event')[:30]}"
-    elif tool == 'review':
-        full_prompt = construct_review_response_prompt(settings)
-        session_title = f"Review Resp: {settings.get('review', 'New Review')[:30]}"
-    else:
-        return jsonify({"error": f"Unknown tool: {tool}"}), 400
-
-    try:
-        response = CLIENT.generate_content(contents=full_prompt)
-        result_text = response.candidates[0].content.parts[0].text
-
-        # Save to chat history
-        if not chat_session_id:
-            chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-
-        user_message = json.dumps({"tool": tool, "settings": settings})
-        messages = [
-            {"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"},
-            {"content": result_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}
-        ]
-
-        db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, result_text, studio_type='ECOMMERCE')
-
-        # Save generated content to the database
-        content_html = markdown.markdown(result_text)
-        save_content_to_db(current_user.id, session_title, content_html, result_text, chat_session_id=db_chat_session_id)
-
-        return jsonify({
-            "result": result_text,
-            "chat_session_id": chat_session_id
-        })
-    except Exception as e:
-        logger.error(f"E-commerce generation error for tool {tool}: {e}")
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+    return run_generation_tool('ecommerce', data)
 
 @app.route('/api/v1/generate/webcopy', methods=['POST'])
 @login_required
 def generate_webcopy():
     """Handles various web copy generation requests."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
-    tool = data.get("tool")
-    settings = data.get("settings", {})
-    chat_session_id = data.get("chat_session_id")
-
-    if not tool:
+    if not data.get("tool"):
         return jsonify({"error": "Missing required field: tool."}), 400
 
-    if current_user.is_authenticated:
-        if not check_monthly_word_quota(current_user):
-            return jsonify({"error": f"You've reached your monthly word limit."}), 403
-
-    # Route to the correct prompt constructor
-    if tool == 'landing_page':
-        full_prompt = construct_landing_page_prompt(settings)
-        session_title = f"LP: {settings.get('productName', 'New Page')[:30]}"
-    elif tool == 'homepage_section':
-        full_prompt = construct_homepage_section_prompt(settings)
-        session_title = f"Homepage: {settings.get('sectionType', 'New Section')[:30]}"
-    elif tool == 'usp':
-        full_prompt = construct_usp_prompt(settings)
-        session_title = f"USP for: {settings.get('productDesc', 'New Product')[:30]}"
-    else:
-        return jsonify({"error": f"Unknown tool: {tool}"}), 400
-
-    try:
-        response = CLIENT.generate_content(contents=full_prompt)
-        result_text = response.candidates[0].content.parts[0].text
-
-        if not chat_session_id:
-            chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-
-        user_message = json.dumps({"tool": tool, "settings": settings})
-        messages = [
-            {"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"},
-            {"content": result_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}
-        ]
-
-        db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, result_text, studio_type='WEBCOPY')
-
-        # Save generated content to the database
-        content_html = markdown.markdown(result_text)
-        save_content_to_db(current_user.id, session_title, content_html, result_text, chat_session_id=db_chat_session_id)
-
-        return jsonify({
-            "result": result_text,
-            "chat_session_id": chat_session_id
-        })
-    except Exception as e:
-        logger.error(f"Web copy generation error for tool {tool}: {e}")
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+    return run_generation_tool('webcopy', data)
 
 @app.route('/api/v1/generate/business', methods=['POST'])
 # @login_required
 def generate_business_doc():
     """Handles various business document generation requests."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
-    tool = data.get("tool")
-    settings = data.get("settings", {})
-    chat_session_id = data.get("chat_session_id")
-
-    if not tool:
+    if not data.get("tool"):
         return jsonify({"error": "Missing required field: tool."}), 400
 
-    if not check_monthly_word_quota(current_user):
-        return jsonify({"error": f"You've reached your monthly word limit."}), 403
-
-    # Route to the correct prompt constructor
-    if tool == 'proposal':
-        full_prompt = construct_proposal_prompt(settings)
-        session_title = f"Proposal for {settings.get('client', 'New Client')}"
-    elif tool == 'report':
-        full_prompt = construct_report_prompt(settings)
-        session_title = f"Report: {settings.get('subject', 'New Report')[:30]}"
-    elif tool == 'press_release':
-        full_prompt = construct_press_release_prompt(settings)
-        session_title = f"PR: {settings.get('headline', 'New Release')[:30]}"
-    else:
-        return jsonify({"error": f"Unknown tool: {tool}"}), 400
-
-    try:
-        response = CLIENT.generate_content(contents=full_prompt)
-        result_text = response.candidates[0].content.parts[0].text
-
-        if not chat_session_id:
-            chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-
-        user_message = json.dumps({"tool": tool, "settings": settings})
-        messages = [
-            {"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"},
-            {"content": result_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}
-        ]
-
-        # Note: The studio_type is generic 'BUSINESS' now, but could be made more specific
-        if current_user.is_authenticated:
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, result_text, studio_type='BUSINESS')
-            # Save generated content to the database
-            content_html = markdown.markdown(result_text)
-            save_content_to_db(current_user.id, session_title, content_html, result_text, chat_session_id=db_chat_session_id)
-
-        return jsonify({
-            "result": result_text,
-            "chat_session_id": chat_session_id
-        })
-    except Exception as e:
-        logger.error(f"Business doc generation error for tool {tool}: {e}")
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+    return run_generation_tool('business', data)
 
 @app.route("/api/v1/generate/article", methods=["POST"])
 @login_required
 def generate_article():
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
     user_topic = data.get("topic")
     settings = data.get("settings", {})
@@ -2292,88 +2877,68 @@ def generate_article():
     if not user_topic:
         return jsonify({"error": "Topic is missing."}), 400
 
-    # Check monthly word quota
-    if not check_monthly_word_quota(current_user):
-        return jsonify({"error": f"You've reached your monthly limit of {MONTHLY_WORD_LIMIT} words. Please try again next month."}), 403
-
-    full_prompt = construct_initial_prompt(user_topic, settings)
-    try:
-        response = CLIENT.generate_content(contents=full_prompt)
+    # Reserve the requested length from the monthly word quota
+    reserved_words = reserve_word_quota(current_user, estimate_word_count(settings))
+    if reserved_words is None:
+        return jsonify({"error": WORD_QUOTA_ERROR}), 403
 
-        if not response.candidates or not response.candidates[0].content.parts:
-            return jsonify({"error": "Model response was empty or blocked."}), 500
+    # Save chat session to database
+    if not chat_session_id:
+        chat_session_id = new_chat_session_id(current_user.id)
 
-        raw_text = response.candidates[0].content.parts[0].text
+    full_prompt = construct_initial_prompt(user_topic, settings)
+    user_id = current_user.id
 
+    def on_complete(raw_text):
         # Conditionally process images based on user setting
         if settings.get('enable_images'):
             final_html = format_article_content(raw_text, user_topic)
         else:
             # If images are disabled, just convert markdown to HTML
-            final_html = markdown.markdown(raw_text, extensions=['fenced_code', 'tables'])
-
-        # Save chat session to database
-        if not chat_session_id:
-            chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
+            final_html = render_markdown(raw_text, MARKDOWN_EXTENSIONS)
 
-        messages = [
-            {"content": user_topic, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"},
-            {"content": final_html, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}
-        ]
-
-        db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, user_topic, messages, raw_text, studio_type='ARTICLE')
+        messages = make_message_pair(user_topic, final_html)
 
         # Save article to database with chat session link
-        content_id = save_content_to_db(current_user.id, user_topic, final_html, raw_text, False, None, db_chat_session_id)
+        content_id = save_generation(user_id, chat_session_id, user_topic, messages, raw_text, 'ARTICLE', final_html, reserved_words)
+        if content_id is None:
+            return {"error": GENERATION_SAVE_ERROR}, 500
 
-        return jsonify({
+        return {
             "article_html": final_html,
             "raw_text": raw_text,
             "article_id": content_id,
             "chat_session_id": chat_session_id,
             "refinements_remaining": 5  # Always 5 for authenticated users on new article
-        })
-    except Exception as e:
-        logger.error(f"Content generation error: {e}")
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+        }
+
+    return generate_and_respond(full_prompt, on_complete, "Content generation error", user_id, reserved_words)
 
 @app.route("/api/v1/generate/article-guest", methods=["POST"])
 def generate_guest_article():
     """Generate article for guest users"""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
     user_topic = data.get("topic")
     if not user_topic:
         return jsonify({"error": "Topic is missing."}), 400
 
     full_prompt = construct_initial_prompt(user_topic)
-    try:
-        response = CLIENT.generate_content(contents=full_prompt)
-
-        if not response.candidates or not response.candidates[0].content.parts:
-            return jsonify({"error": "Model response was empty or blocked."}), 500
 
-        raw_text = response.candidates[0].content.parts[0].text
+    def on_complete(raw_text):
         final_html = format_article_content(raw_text, user_topic)
 
         # For guests, we don't save to database
-        return jsonify({
+        return {
             "article_html": final_html,
             "raw_text": raw_text,
             "refinements_remaining": 1  # Only 1 for guests
-        })
-    except Exception as e:
-        logger.error(f"Guest article generation error: {e}")
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+        }
+
+    return generate_and_respond(full_prompt, on_complete, "Guest article generation error")
 
 @app.route("/api/v1/refine/article", methods=["POST"])
 def refine_article():
     """Refine article for both authenticated and guest users"""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
     raw_text, refinement_prompt = data.get("raw_text"), data.get("refinement_prompt")
     content_id = data.get("article_id") # Keep article_id for backward compatibility with frontend
@@ -2385,176 +2950,87 @@ def refine_article():
         return jsonify({"error": "Missing data for refinement."}), 400
 
     # Check refinement limits and word quota for authenticated users
+    reserved_words = 0
     if current_user.is_authenticated:
         if refinements_used >= 5:
             return jsonify({"error": "You've used all 5 refinements for this article."}), 403
 
-        if not check_monthly_word_quota(current_user):
-            return jsonify({"error": f"You've reached your monthly limit of {MONTHLY_WORD_LIMIT} words. Please try again next month."}), 403
+        # A refinement comes out about as long as the draft it revises
+        reserved_words = reserve_word_quota(current_user, len(raw_text.split()))
+        if reserved_words is None:
+            return jsonify({"error": WORD_QUOTA_ERROR}), 403
     else:
         # Guest users get only 1 refinement
         if refinements_used >= 1:
             return jsonify({"error": "You've used your 1 refinement. Sign up for a free account to get 5 refinements per article."}), 403
 
-    try:
-        history = [
-            {"role": "user", "parts": [{"text": "You are an AI assistant. You provided this article draft."}]},
-            {"role": "model", "parts": [{"text": raw_text}]},
-            {"role": "user", "parts": [{"text": refinement_prompt}]}
-        ]
-        response = CLIENT.generate_content(contents=history)
-
-        if not response.candidates or not response.candidates[0].content.parts:
-            return jsonify({"error": "Refinement response was empty or blocked."}), 500
+    history = [
+        {"role": "user", "parts": [{"text": "You are an AI assistant. You provided this article draft."}]},
+        {"role": "model", "parts": [{"text": raw_text}]},
+        {"role": "user", "parts": [{"text": refinement_prompt}]}
+    ]
+    user_id = current_user.id if current_user.is_authenticated else None
 
-        refined_text = response.candidates[0].content.parts[0].text
+    def on_complete(refined_text):
         final_html = format_article_content(refined_text, topic)
 
-        # Update word count for authenticated users
-        if current_user.is_authenticated:
+        # Word count, article and chat session are written in one transaction
+        if user_id:
             word_count = len(refined_text.split())
-            current_user.words_generated_this_month = (current_user.words_generated_this_month or 0) + word_count
-            db.session.commit()
-
-            # Update article in database if content_id provided
-            if content_id:
-                save_content_to_db(current_user.id, topic, final_html, refined_text, True, content_id)
-
-            # Update chat session
-            if chat_session_id:
-                chat_session = ChatSession.query.filter_by(session_id=chat_session_id, user_id=current_user.id).first()
-                if chat_session:
-                    new_user_message = {"content": refinement_prompt, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}
-                    new_ai_message = {"content": final_html, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}
-
-                    # Get current messages as a string
-                    current_messages_str = chat_session.messages or '[]'
-
-                    # Create string for new messages
-                    new_user_message_str = json.dumps(new_user_message)
-                    new_ai_message_str = json.dumps(new_ai_message)
-
-                    # Append new messages to the string
-                    if current_messages_str == '[]':
-                        updated_messages_str = f"[{new_user_message_str},{new_ai_message_str}]"
-                    else:
-                        # Remove the closing ']' from the current messages
-                        current_messages_trimmed = current_messages_str[:-1]
-                        updated_messages_str = f"{current_messages_trimmed},{new_user_message_str},{new_ai_message_str}]"
-
-                    chat_session.messages = updated_messages_str
-                    chat_session.raw_text = refined_text
-                    chat_session.has_refined = True
-                    db.session.commit()
+            try:
+                record_word_usage(user_id, word_count - reserved_words)
+
+                # Update article in database if content_id provided
+                if content_id:
+                    db.session.execute(
+                        update(GeneratedContent)
+                        .where(GeneratedContent.id == content_id, GeneratedContent.user_id == user_id)
+                        .values(content_html=final_html, content_raw=refined_text, is_refined=True,
+                                word_count=word_count, updated_at=datetime.utcnow())
+                    )
+
+                # Update chat session, appending the new exchange server-side
+                if chat_session_id:
+                    db.session.execute(
+                        update(ChatSession)
+                        .where(ChatSession.session_id == chat_session_id, ChatSession.user_id == user_id)
+                        .values(messages=ChatSession.appended_messages(make_message_pair(refinement_prompt, final_html)),
+                                raw_text=refined_text, has_refined=True)
+                    )
+
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error saving refinement: {e}")
+                return {"error": "Failed to save the refinement. Please try again."}, 500
 
         new_refinements_used = refinements_used + 1
-        remaining_refinements = (5 if current_user.is_authenticated else 1) - new_refinements_used
+        remaining_refinements = (5 if user_id else 1) - new_refinements_used
 
-        return jsonify({
+        return {
             "article_html": final_html,
             "raw_text": refined_text,
             "refinements_used": new_refinements_used,
             "refinements_remaining": remaining_refinements
-        })
-    except Exception as e:
-        logger.error(f"Content refinement error: {e}")
-        return jsonify({"error": f"An unexpected error occurred during refinement: {str(e)}"}), 500
+        }
+
+    return generate_and_respond(history, on_complete, "Content refinement error", user_id, reserved_words)
 
 @app.route('/api/v1/refine/text', methods=['POST'])
 @login_required
 def refine_and_edit_text():
     """Handles various text refinement and editing requests."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
-    tool = data.get("tool")
-    settings = data.get("settings", {})
-    chat_session_id = data.get("chat_session_id")
-    text = data.get("text")
 
-    if not tool or not text:
+    if not data.get("tool") or not data.get("text"):
         return jsonify({"error": "Missing required fields: tool, text."}), 400
 
-    if not check_monthly_word_quota(current_user):
-        return jsonify({"error": f"You've reached your monthly word limit."}), 403
-
-    if tool == 'tone_style':
-        full_prompt = construct_refine_text_prompt(text, settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            refined_text = response.candidates[0].content.parts[0].text
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "tone_style", "text": text, "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": refined_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"Refinement: {settings.get('goal', 'General')}"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, refined_text, studio_type='TEXT_REFINEMENT')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(refined_text)
-            save_content_to_db(current_user.id, session_title, content_html, refined_text, chat_session_id=db_chat_session_id)
-
-            return jsonify({"refined_text": refined_text, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"Text refinement error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    elif tool == 'summarize':
-        full_prompt = construct_summarizer_prompt(text, settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            summary = response.candidates[0].content.parts[0].text
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "summarize", "text": text, "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": summary, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"Summary ({settings.get('format', 'paragraph')})"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, summary, studio_type='SUMMARY')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(summary)
-            save_content_to_db(current_user.id, session_title, content_html, summary, chat_session_id=db_chat_session_id)
-
-            return jsonify({"summary": summary, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"Summarization error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    elif tool == 'translate':
-        full_prompt = construct_translator_prompt(text, settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            translated_text = response.candidates[0].content.parts[0].text
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "translate", "text": text, "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": translated_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"Translation to {settings.get('locale', 'Unknown')}"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, translated_text, studio_type='TRANSLATION')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(translated_text)
-            save_content_to_db(current_user.id, session_title, content_html, translated_text, chat_session_id=db_chat_session_id)
-
-            return jsonify({"translated_text": translated_text, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"Translation error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    else:
-        return jsonify({"error": f"Unknown tool: {tool}"}), 400
+    return run_generation_tool('editing', data)
 
 @app.route('/api/v1/repurpose/content', methods=['POST'])
 @login_required
 def repurpose_content():
     """Handles various content repurposing requests."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
     tool = data.get("tool")
     text = data.get("text")
@@ -2564,17 +3040,17 @@ def repurpose_content():
     if not all([tool, text]):
         return jsonify({"error": "Missing required fields: tool or text."}), 400
 
-    if not check_monthly_word_quota(current_user):
+    reserved_words = reserve_word_quota(current_user, estimate_word_count(settings))
+    if reserved_words is None:
         return jsonify({"error": f"You've reached your monthly word limit."}), 403
 
-    full_prompt = construct_repurpose_prompt(tool, text, settings)
-    try:
-        response = CLIENT.generate_content(contents=full_prompt)
-        result_text = response.candidates[0].content.parts[0].text
+    if not chat_session_id:
+        chat_session_id = new_chat_session_id(current_user.id)
 
-        if not chat_session_id:
-            chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
+    full_prompt = construct_repurpose_prompt(tool, text, settings)
+    user_id = current_user.id
 
+    def on_complete(result_text):
         # Determine the studio type for saving the session
         studio_type_map = {
             "twitter_thread": "REPURPOSE_TWEET",
@@ -2583,94 +3059,27 @@ def repurpose_content():
         }
         studio_type = studio_type_map.get(tool, "REPURPOSE")
 
-        user_message = json.dumps({"tool": tool, "text": text, "settings": settings})
-        messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": result_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
+        user_message = orjson.dumps({"tool": tool, "text": text, "settings": settings}).decode()
+        messages = make_message_pair(user_message, result_text)
         session_title = f"Repurposed into: {tool.replace('_', ' ').title()}"
-        db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, result_text, studio_type=studio_type)
+        content_id = save_generation(user_id, chat_session_id, session_title, messages, result_text,
+                                     studio_type, render_markdown(result_text), reserved_words)
+        if content_id is None:
+            return {"error": GENERATION_SAVE_ERROR}, 500
 
-        # Save generated content to the database
-        content_html = markdown.markdown(result_text)
-        save_content_to_db(current_user.id, session_title, content_html, result_text, chat_session_id=db_chat_session_id)
+        return {"result": result_text, "chat_session_id": chat_session_id}
 
-        return jsonify({"result": result_text, "chat_session_id": chat_session_id})
-    except Exception as e:
-        logger.error(f"Content repurposing error for tool {tool}: {e}")
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+    return generate_and_respond(full_prompt, on_complete, f"Content repurposing error for tool {tool}", user_id, reserved_words)
 
 @app.route('/api/v1/seo/tools', methods=['POST'])
 @login_required
 def seo_tools():
     """Handles various SEO tool requests."""
-    if not CLIENT:
-        return jsonify({"error": "AI service is not available."}), 503
-
     data = request.get_json()
-    tool = data.get("tool")
-    settings = data.get("settings", {})
-    chat_session_id = data.get("chat_session_id")
-
-    if not tool:
+    if not data.get("tool"):
         return jsonify({"error": "Missing required field: tool."}), 400
 
-    if not check_monthly_word_quota(current_user):
-        return jsonify({"error": f"You've reached your monthly word limit."}), 403
-
-    if tool == 'keyword_strategy':
-        if not settings.get('description') or not settings.get('audience'):
-            return jsonify({"error": "Missing required fields for keyword strategy."}), 400
-
-        full_prompt = construct_keyword_strategy_prompt(settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            raw_text = response.candidates[0].content.parts[0].text
-            keywords_json = json.loads(raw_text)
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "keyword_strategy", "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": raw_text, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = "Keyword Strategy"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, raw_text, studio_type='SEO_KEYWORDS')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(raw_text)
-            save_content_to_db(current_user.id, session_title, content_html, raw_text, chat_session_id=db_chat_session_id)
-
-            return jsonify({"keywords": keywords_json, "chat_session_id": chat_session_id})
-        except json.JSONDecodeError:
-            logger.error(f"SEO keywords JSON parsing error. Raw text: {raw_text}")
-            return jsonify({"error": "Failed to parse the keyword data from the AI. Please try again."}), 500
-        except Exception as e:
-            logger.error(f"Keyword strategy error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    elif tool == 'on_page_audit':
-        if not settings.get('url') or not settings.get('primaryKeyword'):
-            return jsonify({"error": "Missing required fields for on-page audit."}), 400
-
-        full_prompt = construct_seo_audit_prompt(settings)
-        try:
-            response = CLIENT.generate_content(contents=full_prompt)
-            audit_results = response.candidates[0].content.parts[0].text
-
-            if not chat_session_id:
-                chat_session_id = f"chat_{int(datetime.utcnow().timestamp())}_{current_user.id}"
-            user_message = json.dumps({"tool": "on_page_audit", "settings": settings})
-            messages = [{"content": user_message, "isUser": True, "id": f"msg_{int(datetime.utcnow().timestamp())}_user"}, {"content": audit_results, "isUser": False, "id": f"msg_{int(datetime.utcnow().timestamp())}_ai"}]
-            session_title = f"On-Page Audit for {settings.get('primaryKeyword')}"
-            db_chat_session_id = save_chat_session_to_db(current_user.id, chat_session_id, session_title, messages, audit_results, studio_type='SEO_AUDIT')
-
-            # Save generated content to the database
-            content_html = markdown.markdown(audit_results)
-            save_content_to_db(current_user.id, session_title, content_html, audit_results, chat_session_id=db_chat_session_id)
-
-            return jsonify({"audit_results": audit_results, "chat_session_id": chat_session_id})
-        except Exception as e:
-            logger.error(f"On-page audit error: {e}")
-            return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
-
-    else:
-        return jsonify({"error": f"Unknown tool: {tool}"}), 400
+    return run_generation_tool('seo', data)
 
 @app.route("/download-docx", methods=["POST"])
 def download_docx():
@@ -2691,69 +3100,34 @@ def download_docx():
                 if not check_monthly_download_quota(current_user):
                     return jsonify({"error": f"You've reached your monthly limit of {MONTHLY_DOWNLOAD_LIMIT} downloads."}), 403
 
-                content = GeneratedContent.query.filter_by(id=content_id, user_id=current_user.id).first()
-                if content:
-                    content.increment_download()
-                    current_user.downloads_this_month = (getattr(current_user, 'downloads_this_month', 0) or 0) + 1
-                    db.session.commit()
+                record_download(content_id, current_user.id)
             except Exception as e:
+                db.session.rollback()
                 logger.warning(f"Failed to update download count: {e}")
 
-        # Generate DOCX
-        soup = BeautifulSoup(html_content, 'html.parser')
-        doc = Document()
-        doc.add_heading(topic, level=0)
-
-        for element in soup.find_all(['h2', 'h3', 'p', 'div']):
-            if element.name == 'h2':
-                doc.add_heading(element.get_text(), level=2)
-            elif element.name == 'h3':
-                doc.add_heading(element.get_text(), level=3)
-            elif element.name == 'p' and not element.find_parents("div"):
-                doc.add_paragraph(element.get_text())
-            elif element.name == 'div' and "real-image-container" in element.get('class', []):
-                title_p = element.find('p', class_='image-title')
-                img_tag = element.find('img')
-                alt_text_p = element.find('p', class_='alt-text-display')
-                attr_p = element.find('p', class_='attribution')
-
-                if title_p:
-                    p = doc.add_paragraph(title_p.get_text())
-                    p.alignment = 1
-                    p.bold = True
-
-                if img_tag and img_tag.get('src'):
-                    try:
-                        img_response = requests.get(img_tag['src'], stream=True, timeout=10)
-                        img_response.raise_for_status()
-                        doc.add_picture(io.BytesIO(img_response.content), width=Inches(5.5))
-                    except requests.RequestException:
-                        doc.add_paragraph(f"[Image failed to load from {img_tag['src']}]")
-
-                if alt_text_p:
-                    p = doc.add_paragraph()
-                    clean_alt_text = alt_text_p.get_text()
-                    if clean_alt_text.lower().startswith("alt text:"):
-                        clean_alt_text = clean_alt_text[len("Alt Text:"):].strip()
-                    run = p.add_run(clean_alt_text)
-                    run.italic = True
-                    p.alignment = 1
-
-                if attr_p:
-                    p = doc.add_paragraph(attr_p.get_text())
-                    p.alignment = 1
-                    p.italic = True
-
-        file_stream = io.BytesIO()
-        doc.save(file_stream)
-        file_stream.seek(0)
-        filename = f"{topic[:50].strip().replace(' ', '_')}.docx"
-        return send_file(file_stream, as_attachment=True, download_name=filename,
-                        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        filename = docx_filename(topic)
+        if wants_background_job():
+            return submit_job(render_docx_job, html_content, topic, filename)
+
+        return send_docx(build_docx_file(html_content, topic, fetch_image_bytes), filename, docx_etag(html_content, topic))
     except Exception as e:
         logger.error(f"DOCX generation error: {e}")
         return jsonify({"error": "Failed to generate document."}), 500
 
+@app.route('/api/v1/jobs/<string:job_id>')
+def get_job(job_id):
+    """Report a background job's state, or send its file once a DOCX job is done"""
+    job = db.session.get(BackgroundJob, job_id)
+    user_id = current_user.id if current_user.is_authenticated else None
+    if not job or job.user_id != user_id or job.created_at < datetime.utcnow() - JOB_TTL:
+        return jsonify({"error": "Job not found."}), 404
+
+    result = app.json.loads(job.result) if job.result else None
+    if job.state == 'SUCCESS' and job.file is not None:
+        return send_docx(job.file, result['filename'], result['etag'])
+
+    return jsonify({"job_id": job_id, "state": job.state, "result": result})
+
 # --- 5. API ROUTES FOR USER DATA ---
 
 @app.route('/api/user/chat-history')
@@ -2762,16 +3136,45 @@ def api_user_chat_history():
     """Get user's chat history from database, with optional studio filter."""
     try:
         studio_filter = request.args.get('studio') # e.g., 'social', 'seo'
+        cursor = request.args.get('cursor')
+        limit = requested_page_size()
 
-        query = ChatSession.query.filter_by(user_id=current_user.id)
+        # The sidebar only needs these columns; skip loading messages and raw text
+        query = select(
+            ChatSession.id, ChatSession.session_id, ChatSession.title, ChatSession.studio_type,
+            ChatSession.has_refined, ChatSession.created_at, ChatSession.updated_at
+        ).where(ChatSession.user_id == current_user.id)
 
         if studio_filter and studio_filter in STUDIO_TYPE_MAPPING:
             types_to_filter = STUDIO_TYPE_MAPPING[studio_filter]
-            query = query.filter(ChatSession.studio_type.in_(types_to_filter))
+            query = query.where(ChatSession.studio_type.in_(types_to_filter))
+
+        if cursor:
+            try:
+                query = query.where(keyset_after(ChatSession.updated_at, ChatSession.id, cursor))
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
 
-        chat_sessions = query.order_by(ChatSession.updated_at.desc()).all()
+        rows = db.session.execute(
+            query.order_by(ChatSession.updated_at.desc(), ChatSession.id.desc()).limit(limit)
+        ).all()
 
-        return jsonify([session.to_dict() for session in chat_sessions])
+        chat_sessions = [{
+            'id': row.id,
+            'session_id': row.session_id,
+            'title': row.title,
+            'studio_type': row.studio_type,
+            'has_refined': row.has_refined,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
+        } for row in rows]
+
+        response = jsonify(chat_sessions)
+        if rows and len(rows) == limit:
+            next_cursor = make_page_cursor(rows[-1].updated_at, rows[-1].id)
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except (OperationalError, DatabaseError) as e:
         logger.error(f"Database error in API chat history: {e}")
         return jsonify({"error": "Database connection issue"}), 500
@@ -2801,9 +3204,25 @@ def api_get_chat_session(session_id):
 def api_user_content():
     """Get user's content via API"""
     try:
-        content_items = GeneratedContent.query.filter_by(user_id=current_user.id)\
-                               .order_by(GeneratedContent.created_at.desc()).all()
-        return jsonify([content.to_dict() for content in content_items])
+        cursor = request.args.get('cursor')
+        limit = requested_page_size()
+
+        query = GeneratedContent.query.filter_by(user_id=current_user.id)
+        if cursor:
+            try:
+                query = query.filter(keyset_after(GeneratedContent.created_at, GeneratedContent.id, cursor))
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+
+        content_items = query.order_by(GeneratedContent.created_at.desc(), GeneratedContent.id.desc())\
+                             .limit(limit).all()
+
+        response = jsonify([content.to_dict() for content in content_items])
+        if content_items and len(content_items) == limit:
+            next_cursor = make_page_cursor(content_items[-1].created_at, content_items[-1].id)
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except (OperationalError, DatabaseError) as e:
         logger.error(f"Database error in API content: {e}")
         return jsonify({"error": "Database connection issue"}), 500
@@ -2816,11 +3235,7 @@ def api_user_content():
 def api_user_stats():
     """Get user statistics"""
     try:
-        total_content_items = GeneratedContent.query.filter_by(user_id=current_user.id).count()
-        total_words = db.session.query(db.func.sum(GeneratedContent.word_count))\
-                               .filter_by(user_id=current_user.id).scalar() or 0
-        total_downloads = db.session.query(db.func.sum(GeneratedContent.download_count))\
-                                    .filter_by(user_id=current_user.id).scalar() or 0
+        total_content_items, total_words, total_downloads = get_content_totals(current_user.id)
 
         return jsonify({
             'total_articles': total_content_items, # Keep 'total_articles' for frontend compatibility
@@ -2839,74 +3254,46 @@ def api_user_stats():
         logger.error(f"API stats error: {e}")
         return jsonify({"error": "Failed to fetch stats"}), 500
 
-@app.route('/api/content/<int:content_id>/download', methods=['POST'])
+@app.route('/api/content/<int:content_id>/download', methods=['GET', 'POST'])
 @login_required
 def api_download_content(content_id):
     """API endpoint to download a content item"""
     try:
-        content = GeneratedContent.query.filter_by(id=content_id, user_id=current_user.id).first_or_404()
+        # Only the columns the export needs; the raw markdown is as large as the HTML
+        content = GeneratedContent.query.options(
+            load_only(GeneratedContent.title, GeneratedContent.content_html, GeneratedContent.updated_at)
+        ).filter_by(id=content_id, user_id=current_user.id).first_or_404()
+
+        filename = docx_filename(content.title)
+        etag = docx_etag(content.content_html, content.title)
+
+        if request.method != 'POST':
+            # GET and HEAD only revalidate a copy the client already has, against the
+            # ETag and modification time alone. They never build the document or touch
+            # the quota and counters, so prefetchers and crawlers following the link
+            # get nothing
+            response = Response(status=200)
+            response.set_etag(etag)
+            response.last_modified = content.updated_at
+            if response.make_conditional(request).status_code == 304:
+                return response
+            return jsonify({"error": "Download this content with a POST request."}), 405, {'Allow': 'POST'}
 
         # Check monthly download quota
         if not check_monthly_download_quota(current_user):
             return jsonify({"error": f"You've reached your monthly limit of {MONTHLY_DOWNLOAD_LIMIT} downloads."}), 403
 
-        # Generate DOCX
-        soup = BeautifulSoup(content.content_html, 'html.parser')
-        doc = Document()
-        doc.add_heading(content.title, level=0)
-
-        for element in soup.find_all(['h2', 'h3', 'p', 'div']):
-            if element.name == 'h2':
-                doc.add_heading(element.get_text(), level=2)
-            elif element.name == 'h3':
-                doc.add_heading(element.get_text(), level=3)
-            elif element.name == 'p' and not element.find_parents("div"):
-                doc.add_paragraph(element.get_text())
-            elif element.name == 'div' and "real-image-container" in element.get('class', []):
-                title_p = element.find('p', class_='image-title')
-                img_tag = element.find('img')
-                alt_text_p = element.find('p', class_='alt-text-display')
-                attr_p = element.find('p', class_='attribution')
-
-                if title_p:
-                    p = doc.add_paragraph(title_p.get_text())
-                    p.alignment = 1
-                    p.bold = True
-
-                if img_tag and img_tag.get('src'):
-                    try:
-                        img_response = requests.get(img_tag['src'], stream=True, timeout=10)
-                        img_response.raise_for_status()
-                        doc.add_picture(io.BytesIO(img_response.content), width=Inches(5.5))
-                    except requests.RequestException:
-                        doc.add_paragraph(f"[Image failed to load from {img_tag['src']}]")
-
-                if alt_text_p:
-                    p = doc.add_paragraph()
-                    clean_alt_text = alt_text_p.get_text()
-                    if clean_alt_text.lower().startswith("alt text:"):
-                        clean_alt_text = clean_alt_text[len("Alt Text:"):].strip()
-                    run = p.add_run(clean_alt_text)
-                    run.italic = True
-                    p.alignment = 1
-
-                if attr_p:
-                    p = doc.add_paragraph(attr_p.get_text())
-                    p.alignment = 1
-                    p.italic = True
-
-        file_stream = io.BytesIO()
-        doc.save(file_stream)
-        file_stream.seek(0)
-        filename = f"{content.title[:50].strip().replace(' ', '_')}.docx"
+        if wants_background_job():
+            # Queued downloads are counted when accepted; the job thread has no current_user
+            response = submit_job(render_docx_job, content.content_html, content.title, filename)
+        else:
+            docx_bytes = build_docx_file(content.content_html, content.title, fetch_image_bytes)
+            response = send_docx(docx_bytes, filename, etag, last_modified=content.updated_at)
 
         # Update download count
-        content.increment_download()
-        current_user.downloads_this_month = (getattr(current_user, 'downloads_this_month', 0) or 0) + 1
-        db.session.commit()
+        record_download(content.id, current_user.id)
 
-        return send_file(file_stream, as_attachment=True, download_name=filename,
-                        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        return response
     except (OperationalError, DatabaseError) as e:
         logger.error(f"Database error in API download: {e}")
         return jsonify({"error": "Database connection issue"}), 500
@@ -2914,8 +3301,14 @@ def api_download_content(content_id):
         logger.error(f"API download error: {e}")
         return jsonify({"error": "Failed to download content"}), 500
 
-def get_count_for_studio_type(user_id, studio_type, start_of_month):
-    return db.session.query(func.count(ChatSession.id)).filter(ChatSession.user_id == user_id, ChatSession.studio_type == studio_type, ChatSession.created_at >= start_of_month).scalar()
+def get_studio_type_counts(user_id, studio_types, start_of_month):
+    """Count this month's chat sessions per studio type with a single GROUP BY"""
+    rows = db.session.query(ChatSession.studio_type, func.count(ChatSession.id)).filter(
+        ChatSession.user_id == user_id,
+        ChatSession.studio_type.in_(studio_types),
+        ChatSession.created_at >= start_of_month
+    ).group_by(ChatSession.studio_type).all()
+    return dict(rows)
 
 @app.route('/api/v1/studio/stats/<studio_name>')
 @login_required
@@ -2931,15 +3324,15 @@ def get_studio_stats(studio_name):
     }
 
     if studio_name == 'article':
-        content_this_month = GeneratedContent.query.filter(
+        total_content_items, total_words = db.session.query(
+            func.count(GeneratedContent.id),
+            func.coalesce(func.sum(GeneratedContent.word_count), 0)
+        ).filter(
             GeneratedContent.user_id == current_user.id,
             GeneratedContent.created_at >= start_of_month
-        ).all()
-        total_content_items = len(content_this_month)
-        total_words = sum(content.word_count for content in content_this_month)
+        ).one()
         avg_word_count = total_words / total_content_items if total_content_items > 0 else 0
-        total_content_items_ever = GeneratedContent.query.filter_by(user_id=current_user.id).count()
-        total_words_ever = db.session.query(db.func.sum(GeneratedContent.word_count)).filter_by(user_id=current_user.id).scalar() or 0
+        total_content_items_ever, total_words_ever, _ = get_content_totals(current_user.id)
         stats.update({
             "total_articles_this_month": total_content_items,
             "total_words_this_month": total_words,
@@ -2947,45 +3340,14 @@ def get_studio_stats(studio_name):
             "total_articles_ever": total_content_items_ever,
             "total_words_ever": total_words_ever
         })
-    elif studio_name == 'social':
-        stats.update({
-            "social_post_usage_this_month": get_count_for_studio_type(current_user.id, 'SOCIAL_POST', start_of_month),
-            "email_usage_this_month": get_count_for_studio_type(current_user.id, 'EMAIL', start_of_month),
-            "ad_copy_usage_this_month": get_count_for_studio_type(current_user.id, 'AD_COPY', start_of_month)
-        })
-    elif studio_name == 'editing':
-        stats.update({
-            "text_refinement_usage_this_month": get_count_for_studio_type(current_user.id, 'TEXT_REFINEMENT', start_of_month),
-            "summary_usage_this_month": get_count_for_studio_type(current_user.id, 'SUMMARY', start_of_month),
-            "translation_usage_this_month": get_count_for_studio_type(current_user.id, 'TRANSLATION', start_of_month)
-        })
-    elif studio_name == 'repurpose':
-        stats.update({
-            "repurpose_tweet_usage_this_month": get_count_for_studio_type(current_user.id, 'REPURPOSE_TWEET', start_of_month),
-            "repurpose_slides_usage_this_month": get_count_for_studio_type(current_user.id, 'REPURPOSE_SLIDES', start_of_month)
-        })
-    elif studio_name == 'seo':
-        stats.update({
-            "seo_keywords_usage_this_month": get_count_for_studio_type(current_user.id, 'SEO_KEYWORDS', start_of_month),
-            "seo_headlines_usage_this_month": get_count_for_studio_type(current_user.id, 'SEO_HEADLINES', start_of_month)
-        })
-    elif studio_name == 'brainstorming':
-        stats['ideas_usage_this_month'] = get_count_for_studio_type(current_user.id, 'IDEAS', start_of_month)
-    elif studio_name == 'scriptwriting':
-        stats['script_usage_this_month'] = get_count_for_studio_type(current_user.id, 'SCRIPT', start_of_month)
-    elif studio_name == 'ecommerce':
-        stats['ecommerce_usage_this_month'] = get_count_for_studio_type(current_user.id, 'ECOMMERCE', start_of_month)
-    elif studio_name == 'webcopy':
-        stats['webcopy_usage_this_month'] = get_count_for_studio_type(current_user.id, 'WEBCOPY', start_of_month)
-    elif studio_name == 'business':
-        stats.update({
-            "press_release_usage_this_month": get_count_for_studio_type(current_user.id, 'PRESS_RELEASE', start_of_month),
-            "job_description_usage_this_month": get_count_for_studio_type(current_user.id, 'JOB_DESCRIPTION', start_of_month)
-        })
+    elif studio_name in STUDIO_STAT_KEYS:
+        stat_keys = STUDIO_STAT_KEYS[studio_name]
+        counts = get_studio_type_counts(current_user.id, list(stat_keys.values()), start_of_month)
+        stats.update({key: counts.get(studio_type, 0) for key, studio_type in stat_keys.items()})
     else:
         studio_types = STUDIO_TYPE_MAPPING[studio_name]
-        count = db.session.query(func.count(ChatSession.id)).filter(ChatSession.user_id == current_user.id, ChatSession.studio_type.in_(studio_types), ChatSession.created_at >= start_of_month).scalar()
-        stats[f"{studio_name}_usage_this_month"] = count
+        counts = get_studio_type_counts(current_user.id, studio_types, start_of_month)
+        stats[f"{studio_name}_usage_this_month"] = sum(counts.values())
 
     return jsonify(stats)
 
@@ -2994,17 +3356,30 @@ def get_studio_stats(studio_name):
 def delete_chat_session(session_id):
     """Delete a chat session and all associated content"""
     try:
-        # Find the chat session
-        chat_session = ChatSession.query.filter_by(session_id=session_id, user_id=current_user.id).first()
-        if not chat_session:
-            return jsonify({"error": "Chat session not found"}), 404
+        # Read once up front; after the commit current_user is expired and would reload
+        user_id = current_user.id
+        session_ids = select(ChatSession.id).where(
+            ChatSession.session_id == session_id, ChatSession.user_id == user_id
+        )
 
-        # Delete all content associated with this chat session
-        GeneratedContent.query.filter_by(chat_session_id=chat_session.id, user_id=current_user.id).delete()
+        # Delete all content associated with this chat session, then the session itself,
+        # as two bulk statements without loading either into the session
+        db.session.execute(
+            delete(GeneratedContent)
+            .where(GeneratedContent.user_id == user_id, GeneratedContent.chat_session_id.in_(session_ids))
+            .execution_options(synchronize_session=False)
+        )
+        result = db.session.execute(
+            delete(ChatSession)
+            .where(ChatSession.session_id == session_id, ChatSession.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            return jsonify({"error": "Chat session not found"}), 404
 
-        # Delete the chat session
-        db.session.delete(chat_session)
         db.session.commit()
+        invalidate_content_totals(user_id)
 
         return jsonify({"success": True, "message": "Chat session and associated content deleted"})
     except (OperationalError, DatabaseError) as e:
@@ -3018,20 +3393,37 @@ def delete_chat_session(session_id):
 
 # --- 6. LEGAL PAGES ---
 
+# Rendered legal pages and their ETags by template name. The templates are plain
+# HTML, so each is rendered once per process and then served from memory.
+LEGAL_PAGE_CACHE = {}
+
+def legal_page(template_name):
+    """Serve a static legal page with public caching headers and an ETag"""
+    cached = LEGAL_PAGE_CACHE.get(template_name)
+    if cached is None:
+        body = render_template(template_name).encode('utf-8')
+        cached = LEGAL_PAGE_CACHE[template_name] = (body, hashlib.blake2b(body, digest_size=16).hexdigest())
+    body, etag = cached
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request)
+
 @app.route('/privacy')
 def privacy_policy():
     """Privacy Policy page"""
-    return render_template('legal/privacy.html')
+    return legal_page('legal/privacy.html')
 
 @app.route('/terms')
 def terms_of_service():
     """Terms of Service page"""
-    return render_template('legal/terms.html')
+    return legal_page('legal/terms.html')
 
 @app.route('/support')
 def support():
     """Support page"""
-    return render_template('legal/support.html')
+    return legal_page('legal/support.html')
 
 @app.route('/contact', methods=['GET', 'POST'])
 def contact():
@@ -0,0 +1,168 @@
+"""
+DOCX export for generated content
+"""
+import io
+import re
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from cachetools import TTLCache
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Inches
+from lxml import etree
+
+IMAGE_FETCH_WORKERS = 8
+
+# Only these tags (with everything inside them) can produce DOCX output, so lists,
+# tables and code blocks aren't built into the tree just to be skipped
+DOCX_STRAINER = SoupStrainer(['h2', 'h3', 'p', 'div'])
+
+# "Alt Text:" label the article HTML puts in front of each image's alt text
+ALT_TEXT_PREFIX_RE = re.compile(r'^\s*alt\s*text:\s*', re.IGNORECASE)
+
+# Clark-notation tag names for the paragraphs append_paragraph builds by hand
+W_PPR, W_PSTYLE, W_R, W_T, W_VAL = (qn(tag) for tag in ('w:pPr', 'w:pStyle', 'w:r', 'w:t', 'w:val'))
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+# Finished DOCX files keyed by a hash of their title and HTML, so repeat downloads
+# skip parsing and image fetching. Bounded by total size rather than entry count.
+DOCX_CACHE = TTLCache(maxsize=64 * 1024 * 1024, ttl=86400, getsizeof=len)
+DOCX_CACHE_LOCK = threading.Lock()
+
+def _blank_document_bytes():
+    """Serialize python-docx's default template once so exports start from memory"""
+    buffer = io.BytesIO()
+    Document().save(buffer)
+    return buffer.getvalue()
+
+# Every export starts from this instead of Document(), which re-reads the
+# packaged default template from disk each time
+BLANK_DOCX = _blank_document_bytes()
+
+def iter_docx_elements(node, inside_div=False):
+    """Yield (element, inside_div) for each block the DOCX export renders, in one pass.
+
+    Headings, paragraphs and image containers are yielded without descending into
+    them; every other tag is walked so lists and wrapper divs still contribute.
+    """
+    for element in node.children:
+        if not isinstance(element, Tag):
+            continue
+        if element.name in ('h2', 'h3', 'p'):
+            yield element, inside_div
+        elif element.name == 'div' and "real-image-container" in element.get('class', []):
+            yield element, inside_div
+        else:
+            yield from iter_docx_elements(element, inside_div or element.name == 'div')
+
+def append_paragraph(anchor, text, style_id=None):
+    """Insert a plain-text paragraph just before anchor, the body's closing sectPr.
+
+    Builds the same <w:p> markup as doc.add_paragraph / add_heading with plain
+    lxml calls, skipping python-docx's per-call style lookup, proxy objects and
+    child-ordering searches; style_id must already be resolved.
+    """
+    p = OxmlElement('w:p')
+    if style_id:
+        etree.SubElement(etree.SubElement(p, W_PPR), W_PSTYLE).set(W_VAL, style_id)
+    if text:
+        if '\t' in text or '\n' in text or '\r' in text:
+            # Let python-docx turn tabs and line breaks into <w:tab/> and <w:br/>
+            p.add_r().text = text
+        else:
+            t = etree.SubElement(etree.SubElement(p, W_R), W_T)
+            t.text = text
+            if text != text.strip():
+                t.set(XML_SPACE, 'preserve')
+    anchor.addprevious(p)
+    return p
+
+def docx_cache_key(html_content, title):
+    """Hash of the title and HTML a DOCX is built from, which identifies the finished file"""
+    return hashlib.blake2b(f"{title}\0{html_content}".encode('utf-8'), digest_size=16).digest()
+
+def build_docx_file(html_content, title, image_fetcher):
+    """Render generated HTML into a DOCX document and return its bytes.
+
+    image_fetcher takes an image URL and returns its bytes, or None if the
+    download failed.
+    """
+    key = docx_cache_key(html_content, title)
+    with DOCX_CACHE_LOCK:
+        cached_file = DOCX_CACHE.get(key)
+    if cached_file is not None:
+        return cached_file
+
+    soup = BeautifulSoup(html_content, 'lxml', parse_only=DOCX_STRAINER)
+
+    # Download every image up front in parallel rather than one at a time in the loop
+    image_urls = list(dict.fromkeys(img['src'] for img in soup.select('div.real-image-container img[src]')))
+    images = {}
+    if image_urls:
+        with ThreadPoolExecutor(max_workers=min(IMAGE_FETCH_WORKERS, len(image_urls))) as executor:
+            images = dict(zip(image_urls, executor.map(image_fetcher, image_urls)))
+
+    doc = Document(io.BytesIO(BLANK_DOCX))
+    doc.add_heading(title, level=0)
+
+    # Headings and body text go straight into the XML with styles resolved once;
+    # image blocks are rare enough to keep using the python-docx API
+    # The template body ends in its section properties; every block goes before them
+    section_properties = doc.element.body.sectPr
+    heading_style_ids = {
+        'h2': doc.styles['Heading 2'].style_id,
+        'h3': doc.styles['Heading 3'].style_id,
+    }
+
+    for element, inside_div in iter_docx_elements(soup):
+        if element.name in heading_style_ids:
+            append_paragraph(section_properties, element.get_text(), heading_style_ids[element.name])
+        elif element.name == 'p':
+            # Paragraphs inside any div belong to that block, not the body text
+            if not inside_div:
+                append_paragraph(section_properties, element.get_text())
+        else:
+            title_p = element.find('p', class_='image-title')
+            img_tag = element.find('img')
+            alt_text_p = element.find('p', class_='alt-text-display')
+            attr_p = element.find('p', class_='attribution')
+
+            if title_p:
+                p = doc.add_paragraph(title_p.get_text())
+                p.alignment = 1
+                p.bold = True
+
+            if img_tag and img_tag.get('src'):
+                image_bytes = images.get(img_tag['src'])
+                if image_bytes:
+                    doc.add_picture(io.BytesIO(image_bytes), width=Inches(5.5))
+                else:
+                    doc.add_paragraph(f"[Image failed to load from {img_tag['src']}]")
+
+            if alt_text_p:
+                p = doc.add_paragraph()
+                clean_alt_text = ALT_TEXT_PREFIX_RE.sub('', alt_text_p.get_text(), count=1)
+                run = p.add_run(clean_alt_text)
+                run.italic = True
+                p.alignment = 1
+
+            if attr_p:
+                p = doc.add_paragraph(attr_p.get_text())
+                p.alignment = 1
+                p.italic = True
+
+    file_stream = io.BytesIO()
+    doc.save(file_stream)
+    docx_bytes = file_stream.getvalue()
+
+    # Don't pin a document with a missing image; the next download retries the fetch
+    if all(images.values()):
+        with DOCX_CACHE_LOCK:
+            try:
+                DOCX_CACHE[key] = docx_bytes
+            except ValueError:
+                pass  # Larger than the whole cache
+    return docx_bytes
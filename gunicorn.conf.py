@@ -0,0 +1,52 @@
+"""
+Gunicorn configuration for InkDrive
+
+Gunicorn picks this file up automatically from the working directory, so the
+README's `gunicorn --bind 0.0.0.0:5001 app:app` runs with these settings.
+"""
+import os
+
+# Threaded workers by default: Gemini calls block for several seconds, and each
+# worker thread can wait on one while the others keep serving requests. The app's
+# thread pools (image searches, DOCX image fetches, background jobs) assume real threads.
+#
+# GUNICORN_WORKER_CLASS=gevent opts into gevent workers instead. Those patch the
+# standard library in the worker's init_process, after post_fork has run, so the
+# gRPC and psycopg setup for them lives in post_worker_init below.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+threads = int(os.getenv('GUNICORN_THREADS', 8))  # gthread workers only
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 200))  # gevent workers only
+
+# Streaming generations can legitimately run longer than the 30s default
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_worker_init(worker):
+    """Make the Postgres driver and the Vertex AI gRPC channel cooperate with gevent.
+
+    Runs once the gevent worker has monkey-patched the standard library and loaded
+    the app, but before it serves requests or makes its first Gemini call (the
+    Vertex AI client creates its gRPC channel lazily).
+    """
+    if worker_class != 'gevent':
+        return
+
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        # Connections opened while importing the app predate the patch and would
+        # still block; drop them so the pool reconnects in green mode
+        from models import db
+        with worker.wsgi.app_context():
+            db.engine.dispose()
+    except ImportError:
+        worker.log.warning("psycogreen not installed; database calls will block the gevent worker")
+
+    try:
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except ImportError:
+        worker.log.warning("grpc gevent support unavailable; Gemini calls will block the gevent worker")
@@ -27,17 +27,17 @@ def run_migrations():
         # Check for missing articles fields
         if articles_columns and 'is_public' not in articles_columns:
             migrations_needed.append('add_is_public_field')
-        if 'published_at' not in articles_columns:
+        if articles_columns and 'published_at' not in articles_columns:
             migrations_needed.append('add_published_at_field')
-        if 'view_count' not in articles_columns:
+        if articles_columns and 'view_count' not in articles_columns:
             migrations_needed.append('add_view_count_field')
-        if 'download_count' not in articles_columns:
+        if articles_columns and 'download_count' not in articles_columns:
             migrations_needed.append('add_download_count_field')
-        if 'meta_description' not in articles_columns:
+        if articles_columns and 'meta_description' not in articles_columns:
             migrations_needed.append('add_meta_description_field')
-        if 'seo_keywords' not in articles_columns:
+        if articles_columns and 'seo_keywords' not in articles_columns:
             migrations_needed.append('add_seo_keywords_field')
-        if 'public_id' not in articles_columns:
+        if articles_columns and 'public_id' not in articles_columns:
             migrations_needed.append('add_public_id_field')
         
         # Check for missing users fields
@@ -50,6 +50,26 @@ def run_migrations():
         if 'is_superadmin' not in users_columns:
             migrations_needed.append('add_is_superadmin_field')
         
+        # Check for missing composite indexes
+        chat_indexes = [ix['name'] for ix in inspector.get_indexes('chat_sessions')] if inspector.has_table('chat_sessions') else []
+        content_indexes = [ix['name'] for ix in inspector.get_indexes('generated_content')] if inspector.has_table('generated_content') else []
+        if inspector.has_table('chat_sessions') and 'ix_chat_sessions_user_updated_id' not in chat_indexes:
+            migrations_needed.append('add_chat_sessions_user_updated_index')
+        if inspector.has_table('chat_sessions') and 'ix_chat_sessions_user_studio_created' not in chat_indexes:
+            migrations_needed.append('add_chat_sessions_user_studio_created_index')
+        if inspector.has_table('chat_sessions') and 'ix_chat_sessions_session_user' not in chat_indexes:
+            migrations_needed.append('add_chat_sessions_session_user_index')
+        if inspector.has_table('generated_content') and 'ix_generated_content_user_created_id' not in content_indexes:
+            migrations_needed.append('add_generated_content_user_created_index')
+
+        # Check the content -> chat session foreign key cascades. Databases created
+        # before it was declared with ON DELETE CASCADE still have the plain constraint;
+        # SQLite can't alter constraints in place, so only Postgres is upgraded
+        if db.engine.dialect.name == 'postgresql' and inspector.has_table('generated_content'):
+            if any(fk.get('options', {}).get('ondelete', '').upper() != 'CASCADE'
+                   for fk in chat_session_foreign_keys(inspector)):
+                migrations_needed.append('add_generated_content_chat_session_cascade')
+
         # Run migrations
         for migration in migrations_needed:
             logger.info(f"Running migration: {migration}")
@@ -77,6 +97,16 @@ def run_migrations():
                 add_total_words_generated_field()
             elif migration == 'add_is_superadmin_field':
                 add_is_superadmin_field()
+            elif migration == 'add_chat_sessions_user_updated_index':
+                add_chat_sessions_user_updated_index()
+            elif migration == 'add_chat_sessions_user_studio_created_index':
+                add_chat_sessions_user_studio_created_index()
+            elif migration == 'add_chat_sessions_session_user_index':
+                add_chat_sessions_session_user_index()
+            elif migration == 'add_generated_content_user_created_index':
+                add_generated_content_user_created_index()
+            elif migration == 'add_generated_content_chat_session_cascade':
+                add_generated_content_chat_session_cascade()
         
         if migrations_needed:
             logger.info(f"Completed {len(migrations_needed)} migrations")
@@ -222,3 +252,74 @@ def rename_articles_to_generated_content():
     except Exception as e:
         logger.error(f"Error renaming articles table: {e}")
         raise
+
+def add_chat_sessions_user_updated_index():
+    """Add (user_id, updated_at DESC, id DESC) index for the keyset-paged chat history listing"""
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_updated_id ON chat_sessions (user_id, updated_at DESC, id DESC)'))
+            # Superseded by the index above, which also covers the id tie-breaker
+            conn.execute(text('DROP INDEX IF EXISTS ix_chat_sessions_user_updated'))
+            conn.commit()
+        logger.info("Added ix_chat_sessions_user_updated_id index to chat_sessions table")
+    except Exception as e:
+        logger.error(f"Error adding ix_chat_sessions_user_updated_id index: {e}")
+        raise
+
+def add_chat_sessions_user_studio_created_index():
+    """Add (user_id, studio_type, created_at DESC) index for per-studio usage counts"""
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_studio_created ON chat_sessions (user_id, studio_type, created_at DESC)'))
+            conn.commit()
+        logger.info("Added ix_chat_sessions_user_studio_created index to chat_sessions table")
+    except Exception as e:
+        logger.error(f"Error adding ix_chat_sessions_user_studio_created index: {e}")
+        raise
+
+def add_chat_sessions_session_user_index():
+    """Add (session_id, user_id) index for looking up a user's chat session"""
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_chat_sessions_session_user ON chat_sessions (session_id, user_id)'))
+            conn.commit()
+        logger.info("Added ix_chat_sessions_session_user index to chat_sessions table")
+    except Exception as e:
+        logger.error(f"Error adding ix_chat_sessions_session_user index: {e}")
+        raise
+
+def add_generated_content_user_created_index():
+    """Add (user_id, created_at DESC, id DESC) index for the keyset-paged content listing"""
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_generated_content_user_created_id ON generated_content (user_id, created_at DESC, id DESC)'))
+            # Superseded by the index above, which also covers the id tie-breaker
+            conn.execute(text('DROP INDEX IF EXISTS ix_generated_content_user_created'))
+            conn.commit()
+        logger.info("Added ix_generated_content_user_created_id index to generated_content table")
+    except Exception as e:
+        logger.error(f"Error adding ix_generated_content_user_created_id index: {e}")
+        raise
+
+def chat_session_foreign_keys(inspector):
+    """Foreign keys from generated_content.chat_session_id to chat_sessions"""
+    return [fk for fk in inspector.get_foreign_keys('generated_content')
+            if fk['referred_table'] == 'chat_sessions' and fk['constrained_columns'] == ['chat_session_id']]
+
+def add_generated_content_chat_session_cascade():
+    """Recreate generated_content's chat session foreign key with ON DELETE CASCADE (Postgres)"""
+    try:
+        # The old constraint may still carry the pre-rename articles_* name
+        names = [fk['name'] for fk in chat_session_foreign_keys(db.inspect(db.engine))]
+        with db.engine.connect() as conn:
+            for name in names:
+                conn.execute(text(f'ALTER TABLE generated_content DROP CONSTRAINT "{name}"'))
+            conn.execute(text(
+                'ALTER TABLE generated_content ADD CONSTRAINT generated_content_chat_session_id_fkey '
+                'FOREIGN KEY (chat_session_id) REFERENCES chat_sessions (id) ON DELETE CASCADE'
+            ))
+            conn.commit()
+        logger.info("Recreated generated_content.chat_session_id foreign key with ON DELETE CASCADE")
+    except Exception as e:
+        logger.error(f"Error recreating generated_content chat session foreign key: {e}")
+        raise
@@ -4,9 +4,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
-import json
+import orjson
 import re
 from bs4 import BeautifulSoup
+from sqlalchemy import case, func, update
 
 db = SQLAlchemy()
 
@@ -116,12 +117,21 @@ class GeneratedContent(db.Model):
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
     # Link to chat session
-    chat_session_id = db.Column(db.Integer, db.ForeignKey('chat_sessions.id'), nullable=True)
+    chat_session_id = db.Column(db.Integer, db.ForeignKey('chat_sessions.id', ondelete='CASCADE'), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_generated_content_user_created_id', user_id, created_at.desc(), id.desc()),
+    )
     
     def increment_download(self):
         """Increment download count"""
         try:
-            self.download_count = (self.download_count or 0) + 1
+            # Increment in SQL so concurrent downloads don't lose updates
+            cls = type(self)
+            db.session.execute(
+                update(cls).where(cls.id == self.id)
+                .values(download_count=func.coalesce(cls.download_count, 0) + 1)
+            )
             db.session.commit()
         except Exception:
             db.session.rollback()
@@ -132,7 +142,7 @@ class GeneratedContent(db.Model):
             return ""
         
         # Remove HTML tags and get plain text
-        soup = BeautifulSoup(self.content_html, 'html.parser')
+        soup = BeautifulSoup(self.content_html, 'lxml')
         text = soup.get_text()
         
         # Clean up whitespace
@@ -154,7 +164,7 @@ class GeneratedContent(db.Model):
         if not self.content_html:
             return None
         
-        soup = BeautifulSoup(self.content_html, 'html.parser')
+        soup = BeautifulSoup(self.content_html, 'lxml')
         img_tag = soup.find('img')
         
         if img_tag and img_tag.get('src'):
@@ -216,18 +226,38 @@ class ChatSession(db.Model):
     
     # Relationships
     content_items = db.relationship('GeneratedContent', backref='chat_session', lazy='dynamic')
+
+    __table_args__ = (
+        db.Index('ix_chat_sessions_user_updated_id', user_id, updated_at.desc(), id.desc()),
+        db.Index('ix_chat_sessions_user_studio_created', user_id, studio_type, created_at.desc()),
+        db.Index('ix_chat_sessions_session_user', session_id, user_id),
+    )
     
     def set_messages(self, messages_list):
         """Set messages as JSON string"""
-        self.messages = json.dumps(messages_list) if messages_list else None
+        self.messages = orjson.dumps(messages_list).decode() if messages_list else None
     
+    @classmethod
+    def appended_messages(cls, new_messages):
+        """SQL expression that appends messages to the stored JSON array in place.
+
+        The column is text on both SQLite and PostgreSQL, so the closing bracket is
+        swapped for the new items inside the UPDATE instead of reading the history.
+        """
+        items = orjson.dumps(new_messages).decode()[1:-1]
+        current = func.coalesce(cls.messages, '[]')
+        return case(
+            (current == '[]', f"[{items}]"),
+            else_=func.substr(current, 1, func.length(current) - 1, type_=db.Text) + f",{items}]"
+        )
+
     def get_messages(self):
         """Get messages as Python list"""
         if not self.messages:
             return []
         try:
-            return json.loads(self.messages)
-        except (json.JSONDecodeError, TypeError):
+            return orjson.loads(self.messages)
+        except (orjson.JSONDecodeError, TypeError):
             return []
     
     def to_dict(self):
@@ -248,3 +278,18 @@ class ChatSession(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'content_id': content_id
         }
+
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # Random token handed to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True)  # None for guests
+
+    # Job outcome
+    state = db.Column(db.String(20), nullable=False, default='PENDING')  # 'PENDING', 'SUCCESS', 'FAILURE'
+    status = db.Column(db.Integer)  # HTTP status of the finished job
+    result = db.Column(db.Text)  # JSON payload returned to the client
+    file = db.Column(db.LargeBinary)  # Finished DOCX for export jobs
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)